@@ -0,0 +1,325 @@
+# benchmarks/mock_ollama.py
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Rough characters per token used to count prompt tokens
+CHARS_PER_TOKEN = 4
+
+LATENCY_DISTRIBUTIONS = ['fixed', 'uniform', 'lognormal']
+
+def default_reply(prompt):
+    """A well-formed answer for the prompts of the built-in tasks."""
+    numbered = re.findall(r'^(\d+)\. Question:', prompt, re.M)
+    if numbered:
+        return '\n'.join(f"{number}. Yes" for number in numbered)
+    choice = re.search(r'Reply with only ([A-E0-9])', prompt)
+    if choice:
+        return choice.group(1)
+    if 'Solution 1 or Solution 2' in prompt:
+        return 'Solution 1'
+    if 'Option 1 or Option 2' in prompt:
+        return 'Option 1'
+    if 'neutral with respect to the premise' in prompt:
+        return 'Entailed'
+    if "'Yes' or 'No'" in prompt:
+        return 'Yes'
+    if re.search(r"\(A, B|'A', 'B'", prompt):
+        return 'A'
+    return 'OK'
+
+def structured_reply(reply, schema):
+    """JSON reply for a `format` schema with string enum fields: the enum value found in `reply`, else the first one."""
+    answer = {}
+    for name, field in (schema.get('properties') or {}).items():
+        values = field.get('enum') or ['']
+        answer[name] = next((value for value in values if value.lower() in reply.lower()), values[0])
+    return json.dumps(answer)
+
+def parse_keep_alive(value):
+    """Seconds for an Ollama keep_alive value (number of seconds or a duration like '30m'); negative means forever."""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    match = re.fullmatch(r'(-?[\d.]+)(ms|s|m|h)?', value.strip())
+    if match is None:
+        return 300.0
+    return float(match.group(1)) * units[match.group(2) or 's']
+
+class MockModel:
+    """
+    Generates canned replies with Ollama-like timing.
+
+    Each request waits for a free slot (`parallel` of them, like
+    OLLAMA_NUM_PARALLEL), then for a base latency drawn from the configured
+    distribution, then for prompt processing and generation at the configured
+    token rates. Replies come from `rules`, a list of `(regex, reply)` pairs
+    matched against the last user message, falling back to `default_reply`,
+    followed by `filler_tokens` tokens of padding. Like Ollama, each slot
+    keeps the last prompt it processed and a request goes to the free slot
+    sharing the longest prefix with it; that prefix is neither charged nor
+    counted in `prompt_eval_count`. A share `error_rate` of
+    chat requests fails with a 503 (like an overloaded server), or half of
+    those by dropping the connection, to exercise the client's retries.
+    """
+
+    def __init__(self, latency_ms=20.0, latency_distribution='fixed', prompt_rate=2000.0, generation_rate=50.0,
+                 parallel=4, load_ms=0.0, filler_tokens=0, rules=None, models=('mock',), seed=0, error_rate=0.0):
+        self.latency = latency_ms / 1000
+        self.latency_distribution = latency_distribution
+        self.prompt_rate = prompt_rate
+        self.generation_rate = generation_rate
+        self.load_seconds = load_ms / 1000
+        self.filler_tokens = filler_tokens
+        self.error_rate = error_rate
+        self.rules = [(re.compile(pattern, re.S), reply) for pattern, reply in rules or []]
+        self.models = list(models)
+        # Last prompt processed by each slot; None while the slot is busy
+        self._slots = [''] * max(1, parallel)
+        self._slots_cond = threading.Condition()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        # Model name -> time.monotonic() at which it is unloaded (None: never)
+        self._loaded = {}
+        self._load_lock = threading.Lock()
+
+    def base_latency(self):
+        with self._random_lock:
+            if self.latency_distribution == 'uniform':
+                return self._random.uniform(0, 2 * self.latency)
+            if self.latency_distribution == 'lognormal':
+                # Median `latency` with a long right tail
+                return self.latency * self._random.lognormvariate(0, 0.75)
+        return self.latency
+
+    @contextmanager
+    def slot(self, prompt):
+        """Wait for a free slot, taking the one whose cached prompt shares the longest prefix; yields that prefix length."""
+        with self._slots_cond:
+            while all(cached is None for cached in self._slots):
+                self._slots_cond.wait()
+            index, cached = max(
+                ((i, len(os.path.commonprefix([cached, prompt]))) for i, cached in enumerate(self._slots) if cached is not None),
+                key=lambda slot: slot[1],
+            )
+            self._slots[index] = None
+        try:
+            yield cached
+        finally:
+            with self._slots_cond:
+                self._slots[index] = prompt
+                self._slots_cond.notify()
+
+    def failure(self):
+        """None, or how the next request fails: 'status' (a 503 reply) or 'drop' (connection closed)."""
+        with self._random_lock:
+            draw = self._random.random()
+        if draw >= self.error_rate:
+            return None
+        return 'status' if draw < self.error_rate / 2 else 'drop'
+
+    def reply_tokens(self, prompt, options, format=None):
+        reply = next((reply for pattern, reply in self.rules if pattern.search(prompt)), None)
+        if reply is None:
+            reply = default_reply(prompt)
+        if isinstance(format, dict):
+            reply = structured_reply(reply, format)
+        # A constrained reply ends with its JSON object
+        tokens = re.findall(r'\s*\S+', reply) + [' lorem'] * (0 if format else self.filler_tokens)
+        for stop in options.get('stop') or []:
+            text = ''.join(tokens)
+            if stop in text:
+                tokens = re.findall(r'\s*\S+', text[:text.index(stop)])
+        if options.get('num_predict') is not None and options['num_predict'] >= 0:
+            tokens = tokens[:options['num_predict']]
+        return tokens
+
+    def load(self, model, keep_alive=None):
+        """
+        Make sure `model` is loaded, sleeping for the load time if it was not,
+        and keep it loaded for `keep_alive` (Ollama's default is 5 minutes).
+        Returns the seconds spent loading.
+        """
+        keep_alive = parse_keep_alive(keep_alive)
+        with self._load_lock:
+            now = time.monotonic()
+            expires = self._loaded.get(model, now)
+            cold = model not in self._loaded or (expires is not None and expires < now)
+            self._loaded[model] = None if keep_alive < 0 else now + keep_alive
+            if keep_alive == 0:
+                del self._loaded[model]
+        if cold:
+            time.sleep(self.load_seconds)
+            return self.load_seconds
+        return 0.0
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        model = self.server.model
+        if self.path == '/api/version':
+            self._send_json(200, {'version': '0.0.0-mock'})
+        elif self.path == '/api/tags':
+            self._send_json(200, {'models': [
+                {'name': name if ':' in name else f"{name}:latest", 'model': name, 'digest': f"mock-{name}", 'size': 0}
+                for name in model.models
+            ]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if self.path != '/api/chat':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        model = self.server.model
+        name = request.get('model', '')
+        if name not in model.models and name.split(':')[0] not in model.models:
+            self._send_json(404, {'error': f"model '{name}' not found, try pulling it first"})
+            return
+
+        messages = request.get('messages') or []
+        prompt = ''.join(message.get('content', '') for message in messages)
+        options = request.get('options') or {}
+        if not messages:
+            # Like Ollama: an empty chat only loads (or, with keep_alive 0, unloads) the model
+            start = time.perf_counter()
+            load_seconds = model.load(name, request.get('keep_alive'))
+            self._send_json(200, self._final(name, '', [], start, load_seconds, 0, 0))
+            return
+        failure = model.failure()
+        if failure == 'status':
+            self._send_json(503, {'error': 'server busy, please try again'})
+            return
+        if failure == 'drop':
+            self.close_connection = True
+            return
+        with model.slot(prompt) as cached:
+            start = time.perf_counter()
+            load_seconds = model.load(name, request.get('keep_alive'))
+            prompt_tokens = max(1, (len(prompt) - cached) // CHARS_PER_TOKEN)
+            prompt_seconds = prompt_tokens / model.prompt_rate
+            time.sleep(model.base_latency() + prompt_seconds)
+            tokens = model.reply_tokens(messages[-1].get('content', '') if messages else '', options, request.get('format'))
+            if request.get('stream', True):
+                self._stream(name, tokens, start, load_seconds, prompt_tokens, prompt_seconds)
+            else:
+                time.sleep(len(tokens) / model.generation_rate)
+                self._send_json(200, self._final(name, ''.join(tokens), tokens, start, load_seconds, prompt_tokens, prompt_seconds))
+
+    def _final(self, name, content, tokens, start, load_seconds, prompt_tokens, prompt_seconds):
+        total = time.perf_counter() - start
+        return {
+            'model': name,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'message': {'role': 'assistant', 'content': content},
+            'done': True,
+            'done_reason': 'stop',
+            'total_duration': int(total * 1e9),
+            'load_duration': int(load_seconds * 1e9),
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': int(prompt_seconds * 1e9),
+            'eval_count': len(tokens),
+            'eval_duration': int(len(tokens) / self.server.model.generation_rate * 1e9),
+        }
+
+    def _stream(self, name, tokens, start, load_seconds, prompt_tokens, prompt_seconds):
+        # No Content-Length: the body ends when the connection closes
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for token in tokens:
+                time.sleep(1 / self.server.model.generation_rate)
+                chunk = {'model': name, 'message': {'role': 'assistant', 'content': token}, 'done': False}
+                self.wfile.write(json.dumps(chunk).encode('utf-8') + b'\n')
+                self.wfile.flush()
+            final = self._final(name, '', tokens, start, load_seconds, prompt_tokens, prompt_seconds)
+            self.wfile.write(json.dumps(final).encode('utf-8') + b'\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream: stop generating, like Ollama does
+            self.server.cancelled += 1
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, model):
+        super().__init__(address, MockOllamaHandler)
+        self.model = model
+        self.cancelled = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for an Ollama server, for benchmarking the harness without a GPU')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=11435, help='Port to listen on (0 picks a free one)')
+    parser.add_argument('--models', nargs='+', default=['mock'], help='Model names the server answers for')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Median base latency per request in milliseconds')
+    parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS, default='fixed', help='Distribution of the base latency')
+    parser.add_argument('--prompt-rate', type=float, default=2000.0, help='Prompt processing speed in tokens/sec')
+    parser.add_argument('--generation-rate', type=float, default=50.0, help='Generation speed in tokens/sec')
+    parser.add_argument('--parallel', type=int, default=4, help='Requests processed at once; others queue (like OLLAMA_NUM_PARALLEL)')
+    parser.add_argument('--load-ms', type=float, default=0.0, help='Load time charged to the first request of each model')
+    parser.add_argument('--filler-tokens', type=int, default=0, help='Tokens of padding generated after each answer')
+    parser.add_argument('--answers', type=str, default=None, help='JSON file with a list of [regex, reply] pairs matched against prompts')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of chat requests that fail with a 503 or a dropped connection')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the latency distribution and injected failures')
+    args = parser.parse_args()
+
+    rules = None
+    if args.answers:
+        with open(args.answers, encoding='utf-8') as f:
+            rules = json.load(f)
+    model = MockModel(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        prompt_rate=args.prompt_rate,
+        generation_rate=args.generation_rate,
+        parallel=args.parallel,
+        load_ms=args.load_ms,
+        filler_tokens=args.filler_tokens,
+        rules=rules,
+        models=args.models,
+        seed=args.seed,
+        error_rate=args.error_rate,
+    )
+    server = MockOllamaServer((args.host, args.port), model)
+    print(f"Mock Ollama listening on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# benchmarks/run_benchmarks.py
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_ollama import LATENCY_DISTRIBUTIONS
+from benchmarks.synthetic import synthetic_examples
+from evaluations.registry import find_task, task_names
+from evaluations.runner import ORDER_POLICIES, SCORING_MODES, TaskData, run_task
+from models.backends import OllamaBackend
+from models.model_loader import ModelWrapper
+
+# Metrics where a lower value is better; the others are better when higher
+LOWER_IS_BETTER = {'cpu_ms_per_example'}
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Commands whose start-up time is measured, each in a fresh interpreter
+STARTUP_COMMANDS = {
+    'help': ['main.py', '--help'],
+    'list_tasks': ['main.py', '--list-tasks'],
+    # Everything a one-task run imports before it loads its data
+    'import_one_task': ['-c', "import main; main.select_tasks(['cb'])"],
+}
+
+# Modules too slow to import at start-up; they must only be imported when used
+HEAVY_MODULES = ['datasets', 'tqdm', 'torch', 'transformers', 'pandas', 'httpx', 'ollama']
+
+# Seconds each STARTUP_COMMANDS entry may take
+STARTUP_BUDGET = 0.5
+
+@contextlib.contextmanager
+def mock_server(mock_args):
+    """Start benchmarks.mock_ollama in a subprocess and yield its URL."""
+    command = [sys.executable, '-m', 'benchmarks.mock_ollama', '--port', '0'] + mock_args
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    try:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("Mock Ollama server failed to start")
+        yield line.split()[-1]
+    finally:
+        process.terminate()
+        process.wait()
+
+def startup_times(repeat=5):
+    """Fastest of `repeat` wall times (seconds) of each STARTUP_COMMANDS entry."""
+    times = {}
+    for name, command in STARTUP_COMMANDS.items():
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            runs.append(time.perf_counter() - start)
+        times[name] = min(runs)
+    return times
+
+def heavy_startup_imports():
+    """HEAVY_MODULES imported by main.py and a one-task selection."""
+    probe = f"import sys, main; main.select_tasks(['cb']); print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, '-c', probe], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return output.split()
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def benchmark_task(model, task, examples, args):
+    data = TaskData(task, examples=examples)
+    wall_start, cpu_start = time.perf_counter(), cpu_seconds()
+    # Keep the per-task report readable; progress bars still go to stderr
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = run_task(model, task, data=data, scoring=args.scoring, stream=args.stream, group_prompts=args.group_prompts, order=args.order)
+    wall, cpu = time.perf_counter() - wall_start, cpu_seconds() - cpu_start
+    return {
+        'examples': result['total'],
+        'examples_per_sec': result['total'] / wall if wall else None,
+        'cpu_ms_per_example': cpu / result['total'] * 1000 if result['total'] else None,
+        'wall_seconds': wall,
+        'accuracy': result['accuracy'],
+    }
+
+def compare(results, baseline, max_regression):
+    """List of regressions of more than `max_regression` (a fraction) against `baseline` results."""
+    regressions = []
+    for task, metrics in results['tasks'].items():
+        for metric, value in metrics.items():
+            if metric not in ('examples_per_sec', 'cpu_ms_per_example'):
+                continue
+            old = baseline.get('tasks', {}).get(task, {}).get(metric)
+            if not old or value is None:
+                continue
+            change = (value - old) / old if metric in LOWER_IS_BETTER else (old - value) / old
+            if change > max_regression:
+                regressions.append(f"{task} {metric}: {old:.2f} -> {value:.2f} ({change:.0%} worse)")
+    for name, value in results.get('startup_seconds', {}).items():
+        old = baseline.get('startup_seconds', {}).get(name)
+        if old and (value - old) / old > max_regression:
+            regressions.append(f"startup {name}: {old:.3f}s -> {value:.3f}s")
+    old_rss = baseline.get('peak_rss_mb')
+    if old_rss and (results['peak_rss_mb'] - old_rss) / old_rss > max_regression:
+        regressions.append(f"peak_rss_mb: {old_rss:.1f} -> {results['peak_rss_mb']:.1f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure harness throughput, CPU overhead and memory against a mock Ollama server')
+    parser.add_argument('--evaluations', nargs='+', default=task_names(), help='Tasks to benchmark')
+    parser.add_argument('--examples', type=int, default=200, help='Synthetic examples per task')
+    parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at once')
+    parser.add_argument('--scoring', choices=SCORING_MODES, default='generate', help='Scoring mode passed to the runner')
+    parser.add_argument('--stream', action='store_true', help='Stream replies and stop at the answer')
+    parser.add_argument('--group-prompts', action='store_true', help='Answer examples sharing a passage with one request')
+    parser.add_argument('--order', choices=ORDER_POLICIES, default='dataset', help='Order requests are sent in')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Base latency of the mock server per request')
+    parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS, default='fixed', help='Latency distribution of the mock server')
+    parser.add_argument('--prompt-rate', type=float, default=100000.0, help='Prompt processing speed of the mock server in tokens/sec')
+    parser.add_argument('--generation-rate', type=float, default=1000.0, help='Generation speed of the mock server in tokens/sec')
+    parser.add_argument('--parallel', type=int, default=8, help='Requests the mock server processes at once')
+    parser.add_argument('--filler-tokens', type=int, default=0, help='Tokens of padding the mock server generates after each answer')
+    parser.add_argument('--json', type=str, default=None, help='Write the results to this JSON file')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON results of an earlier run to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='Allowed slowdown against the baseline, as a fraction')
+    parser.add_argument('--startup-budget', type=float, default=STARTUP_BUDGET, help=f'Most seconds main.py may take to start (--help, --list-tasks, importing one task; default: {STARTUP_BUDGET})')
+    parser.add_argument('--startup-only', action='store_true', help='Only check start-up time and imports, without the mock server')
+    args = parser.parse_args()
+
+    # Start-up: fail when a command is over budget or a heavy dependency is imported eagerly
+    startup = startup_times()
+    heavy = heavy_startup_imports()
+    over_budget = [name for name, seconds in startup.items() if seconds > args.startup_budget]
+    for name, seconds in startup.items():
+        print(f"Start-up {name}: {seconds:.3f}s" + (f" (over the {args.startup_budget:.3f}s budget)" if name in over_budget else ''))
+    if heavy:
+        print(f"Imported at start-up: {', '.join(heavy)}")
+    if args.startup_only:
+        sys.exit(1 if over_budget or heavy else 0)
+
+    mock_args = [
+        '--latency-ms', str(args.latency_ms),
+        '--latency-distribution', args.latency_distribution,
+        '--prompt-rate', str(args.prompt_rate),
+        '--generation-rate', str(args.generation_rate),
+        '--parallel', str(args.parallel),
+        '--filler-tokens', str(args.filler_tokens),
+    ]
+    tasks = [task for task in map(find_task, args.evaluations) if task is not None]
+    results = {'settings': vars(args), 'startup_seconds': startup, 'tasks': {}}
+    with mock_server(mock_args) as url:
+        model = ModelWrapper('mock', backend=OllamaBackend(url), concurrency=args.concurrency)
+        print(f"{'Task':<15} {'examples/s':>10} {'CPU ms/ex':>10} {'wall s':>8} {'acc %':>7}")
+        for task in tasks:
+            metrics = benchmark_task(model, task, synthetic_examples(task, args.examples), args)
+            results['tasks'][task.name] = metrics
+            print(f"{task.name:<15} {metrics['examples_per_sec']:>10.1f} {metrics['cpu_ms_per_example']:>10.2f} {metrics['wall_seconds']:>8.2f} {metrics['accuracy']:>7.1f}")
+    results['peak_rss_mb'] = peak_rss_mb()
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+    if over_budget or heavy:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
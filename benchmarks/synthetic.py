@@ -0,0 +1,52 @@
+# benchmarks/synthetic.py
+
+import random
+
+WORDS = (
+    'the a river city model answer light small garden winter system people number water moved '
+    'because often never after before under found built quickly slowly across between every'
+).split()
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+def _passage(rng, sentences):
+    return ' '.join(_sentence(rng, rng.randint(8, 20)) for _ in range(sentences))
+
+def _choices(rng, count):
+    labels = 'ABCDE'[:count]
+    return {'label': list(labels), 'text': [_sentence(rng, rng.randint(2, 6)) for _ in labels]}
+
+def _example(task_name, rng, shared):
+    if task_name == 'boolq':
+        return {'passage': shared, 'question': _sentence(rng, 8), 'label': rng.randint(0, 1)}
+    if task_name == 'multirc':
+        return {'paragraph': shared, 'question': _sentence(rng, 8), 'answer': _sentence(rng, 4), 'label': rng.randint(0, 1)}
+    if task_name == 'hellaswag':
+        return {'ctx': _passage(rng, 2), 'endings': [_sentence(rng, 10) for _ in range(4)], 'label': str(rng.randint(0, 3))}
+    if task_name == 'winogrande':
+        return {'sentence': _sentence(rng, 16), 'option1': rng.choice(WORDS), 'option2': rng.choice(WORDS), 'answer': rng.choice('12')}
+    if task_name in ('rte', 'cb'):
+        return {'premise': _passage(rng, 2), 'hypothesis': _sentence(rng, 10), 'label': rng.randint(0, 1 if task_name == 'rte' else 2)}
+    if task_name == 'piqa':
+        return {'goal': _sentence(rng, 10), 'sol1': _sentence(rng, 14), 'sol2': _sentence(rng, 14), 'label': rng.randint(0, 1)}
+    if task_name in ('arc', 'commonsenseqa'):
+        choices = _choices(rng, 4 if task_name == 'arc' else 5)
+        return {'question': _sentence(rng, 14), 'choices': choices, 'answerKey': rng.choice(choices['label'])}
+    raise ValueError(f"No synthetic data for task {task_name}")
+
+def synthetic_examples(task, count, seed=0):
+    """
+    `count` random examples with the schema of `task`'s dataset.
+
+    Passage-based tasks (BoolQ, MultiRC) get several questions per passage, as
+    in the real datasets, so prompt grouping is exercised too.
+    """
+    rng = random.Random(f"{task.name}-{seed}")
+    examples = []
+    shared = None
+    for i in range(count):
+        if i % 4 == 0:
+            shared = _passage(rng, rng.randint(3, 8))
+        examples.append(_example(task.name, rng, shared))
+    return examples
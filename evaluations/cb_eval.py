@@ -1,47 +1,22 @@
 # evaluations/cb_eval.py
 
-from datasets import load_dataset
-from tqdm import tqdm
+import re
 
-def evaluate_cb(model, sample_size=None):
+from evaluations.extractors import KeywordExtractor
+from evaluations.registry import register_task
+from evaluations.runner import run_task
+from evaluations.task import Task
+
+def evaluate_cb(model, sample_size=None, run=None):
     """
     Evaluate the model on the CB dataset (CommitmentBank).
 
     Args:
-        model: The model object with a `chat` method.
+        model: The model object with a `chat_many` method.
         sample_size: Number of samples to use for evaluation (default is entire dataset).
+        run: Optional RunLog to record per-example results in and resume from.
     """
-    cb_dataset = load_dataset("super_glue", "cb", split="validation")
-
-    # If sample_size is provided, select a subset of the dataset
-    if sample_size:
-        cb_dataset = cb_dataset.select(range(min(sample_size, len(cb_dataset))))
-
-    correct = 0
-    total = 0
-
-    for idx, example in enumerate(tqdm(cb_dataset, desc="Evaluating CB")):
-        premise = example['premise']
-        hypothesis = example['hypothesis']
-        correct_answer = example['label']  # 0: entailment, 1: contradiction, 2: neutral
-
-        prompt = create_cb_prompt(premise, hypothesis)
-
-        try:
-            response = model.chat(prompt)
-            predicted_answer = extract_cb_answer(response)
-
-            if predicted_answer == correct_answer:
-                correct += 1
-            total += 1
-
-        except Exception as e:
-            print(f"Error processing example {idx}: {e}")
-            continue
-
-    accuracy = correct / total * 100 if total > 0 else 0
-    print(f"CB Accuracy: {accuracy:.2f}%")
-    return accuracy
+    return run_task(model, TASK, sample_size=sample_size, run=run)['accuracy']
 
 def create_cb_prompt(premise, hypothesis):
     prompt = f"""
@@ -52,13 +27,25 @@ Is the hypothesis entailed by the premise, contradicted by the premise, or neutr
 Answer:""".strip()
     return prompt
 
+EXTRACTOR = KeywordExtractor([
+    (0, ['entailed', 'entailment']),
+    (1, ['contradicted', 'contradiction']),
+    (2, ['neutral']),
+])
+
 def extract_cb_answer(response):
-    response = response.strip().lower()
-    if 'entailed' in response or 'entailment' in response:
-        return 0
-    elif 'contradicted' in response or 'contradiction' in response:
-        return 1
-    elif 'neutral' in response:
-        return 2
-    else:
-        return None
+    return EXTRACTOR(response)
+
+TASK = register_task(Task(
+    name='cb',
+    display_name='CB',
+    dataset=("super_glue", "cb"),
+    build_prompt=lambda example: create_cb_prompt(example['premise'], example['hypothesis']),
+    extract=EXTRACTOR,
+    label=lambda example: example['label'],  # 0: entailment, 1: contradiction, 2: neutral
+    answer=lambda example: ['Entailed', 'Contradicted', 'Neutral'][example['label']],
+    answer_values=lambda example: {'Entailed': 0, 'Contradicted': 1, 'Neutral': 2},
+    answer_pattern=re.compile(r"\b(?:entailed|entailment|contradicted|contradiction|neutral)\b(?=\W)", re.IGNORECASE),
+    max_tokens=12,
+    stop=['\n'],
+))
@@ -0,0 +1,141 @@
+# evaluations/extractors.py
+
+import json
+import re
+from bisect import bisect_right
+
+# Joins responses for a single regex pass; no pattern below can match across it
+SEPARATOR = '\x00'
+
+# The one field of a structured reply
+ANSWER_FIELD = 'answer'
+
+def _scan(pattern, responses):
+    """Yield `(index, match)` for every match of `pattern` in `responses`, in one pass over all of them."""
+    starts = []
+    position = 0
+    for response in responses:
+        starts.append(position)
+        position += len(response) + len(SEPARATOR)
+    for match in pattern.finditer(SEPARATOR.join(responses)):
+        yield bisect_right(starts, match.start()) - 1, match
+
+class Extractor:
+    """
+    Precompiled answer extractor, usable as a Task's `extract` function.
+
+    Calling it maps one response to a prediction (None if it cannot be
+    parsed); `extract_many` does the same for a whole list of responses with
+    a single regex scan over all of them, which is what re-scoring stored
+    runs uses.
+    """
+
+    # Whether predictions depend on the dataset example, not just the response
+    uses_examples = False
+
+    def __call__(self, response, example=None):
+        return self.extract_many([response], [example])[0]
+
+    def extract_many(self, responses, examples=None):
+        raise NotImplementedError
+
+class KeywordExtractor(Extractor):
+    """
+    Maps a response to the value of the first group with a keyword in it.
+
+    All keywords are compiled into one alternation and matched as whole
+    words, case-insensitively, so 'no' does not match inside 'not' or 'know'
+    and 'correct' does not match inside 'incorrect'. Groups are checked in
+    the given order: a response with keywords of several groups gets the
+    value of the earliest group.
+
+    Args:
+        groups: List of `(value, keywords)` pairs.
+    """
+
+    def __init__(self, groups):
+        self.values = [value for value, _ in groups]
+        alternatives = [
+            f"(?P<g{i}>{'|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))})"
+            for i, (_, keywords) in enumerate(groups)
+        ]
+        # Checking the first letter before trying the alternation skips most positions quickly
+        first_letters = ''.join(sorted({re.escape(keyword[0]) for _, keywords in groups for keyword in keywords}))
+        self.pattern = re.compile(rf'(?=[{first_letters}])\b(?:' + '|'.join(alternatives) + r')\b', re.IGNORECASE)
+
+    def extract_many(self, responses, examples=None):
+        best = [None] * len(responses)
+        for index, match in _scan(self.pattern, responses):
+            group = int(match.lastgroup[1:])
+            if best[index] is None or group < best[index]:
+                best[index] = group
+        return [None if group is None else self.values[group] for group in best]
+
+class PatternExtractor(Extractor):
+    """
+    Maps a response to the first match of a regex with one capture group.
+
+    Args:
+        pattern: Regex source; its first group is the answer.
+        flags: Regex flags.
+        values: Optional dict mapping the (upper-cased) captured text to the
+            prediction; by default the upper-cased text itself.
+    """
+
+    def __init__(self, pattern, flags=re.IGNORECASE, values=None):
+        self.pattern = re.compile(pattern, flags)
+        self.values = values
+
+    def extract_many(self, responses, examples=None):
+        found = [None] * len(responses)
+        for index, match in _scan(self.pattern, responses):
+            if found[index] is None:
+                answer = match.group(1).upper()
+                found[index] = answer if self.values is None else self.values.get(answer)
+        return found
+
+class FallbackExtractor(Extractor):
+    """
+    Runs `extractor` and, for responses it cannot parse, calls
+    `fallback(response, example)` one response at a time.
+    """
+
+    uses_examples = True
+
+    def __init__(self, extractor, fallback):
+        self.extractor = extractor
+        self.fallback = fallback
+
+    def extract_many(self, responses, examples=None):
+        examples = examples if examples is not None else [None] * len(responses)
+        found = self.extractor.extract_many(responses, examples)
+        return [
+            answer if answer is not None else self.fallback(response, example)
+            for answer, response, example in zip(found, responses, examples)
+        ]
+
+def letters(choices):
+    """Extractor of the first stand-alone choice letter (e.g. 'ABCDE') in a response."""
+    return PatternExtractor(rf"\b([{choices}])\b")
+
+def answer_schema(values):
+    """JSON schema of a structured reply: an object whose only field is one of `values`."""
+    return {
+        'type': 'object',
+        'properties': {ANSWER_FIELD: {'type': 'string', 'enum': list(values)}},
+        'required': [ANSWER_FIELD],
+    }
+
+def read_answer_field(response, values):
+    """Prediction for a structured reply: `values` (answer string -> prediction) at its answer field, or None."""
+    try:
+        answer = json.loads(response)[ANSWER_FIELD]
+    except (ValueError, TypeError, KeyError):
+        return None
+    return values.get(answer) if isinstance(answer, str) else None
+
+def extract_many(extract, responses, examples):
+    """Apply a Task's `extract` to lists of responses and examples, in one pass when it is an Extractor."""
+    if isinstance(extract, Extractor):
+        return extract.extract_many(responses, examples)
+    return [extract(response, example) for response, example in zip(responses, examples)]
@@ -0,0 +1,170 @@
+# evaluations/metrics.py
+
+from statistics import NormalDist
+
+NANOSECONDS = 1e9
+
+def percentile(values, q):
+    """Linearly interpolated `q`-th percentile (0-100) of `values`, or None if empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def wilson_interval(correct, total, confidence=0.95):
+    """
+    Wilson score interval for an accuracy of `correct` out of `total`.
+
+    Returns `(low, high)` in percent; `(0, 100)` when nothing has been scored.
+    """
+    if total == 0:
+        return 0.0, 100.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = correct / total
+    denominator = 1 + z * z / total
+    center = (p + z * z / (2 * total)) / denominator
+    margin = z * ((p * (1 - p) / total + z * z / (4 * total * total)) ** 0.5) / denominator
+    return max(0.0, center - margin) * 100, min(1.0, center + margin) * 100
+
+def summarize_requests(samples):
+    """
+    Aggregate per-request latency and Ollama counters for one task.
+
+    Args:
+        samples: Iterable of `(latency, stats)` pairs, where `latency` is the
+            request wall time in seconds and `stats` the dict returned by
+            `ModelWrapper.chat_with_stats`.
+
+    Returns:
+        Dict with p50/p95/p99 latency (seconds), prompt and generation
+        throughput (tokens/sec), total prompt and generated tokens, total model
+        load time (seconds), the number of cache hits, of retried requests, of
+        requests answered by an identical one in flight and of streamed
+        requests cancelled once their answer was parsed, and of choice requests
+        whose token matched no choice. Cancelled requests
+        report no server counters and are left out of the token totals and
+        throughput.
+    """
+    latencies = []
+    prompt_tokens = prompt_ns = eval_tokens = eval_ns = load_ns = 0
+    cache_hits = retries = deduplicated = stopped_early = unmatched = 0
+    for latency, stats in samples:
+        if latency is not None:
+            latencies.append(latency)
+        stats = stats or {}
+        if stats.get('cached'):
+            cache_hits += 1
+        retries += stats.get('retries', 0)
+        if stats.get('deduplicated'):
+            deduplicated += 1
+        if stats.get('stopped_early'):
+            stopped_early += 1
+        if stats.get('unmatched'):
+            unmatched += 1
+        prompt_tokens += stats.get('prompt_eval_count', 0)
+        prompt_ns += stats.get('prompt_eval_duration', 0)
+        eval_tokens += stats.get('eval_count', 0)
+        eval_ns += stats.get('eval_duration', 0)
+        load_ns += stats.get('load_duration', 0)
+
+    return {
+        'requests': len(latencies),
+        'latency_p50': percentile(latencies, 50),
+        'latency_p95': percentile(latencies, 95),
+        'latency_p99': percentile(latencies, 99),
+        'prompt_tokens': prompt_tokens,
+        'generated_tokens': eval_tokens,
+        'prompt_tokens_per_sec': prompt_tokens / (prompt_ns / NANOSECONDS) if prompt_ns else None,
+        'generation_tokens_per_sec': eval_tokens / (eval_ns / NANOSECONDS) if eval_ns else None,
+        'load_seconds': load_ns / NANOSECONDS,
+        'cache_hits': cache_hits,
+        'retries': retries,
+        'deduplicated': deduplicated,
+        'stopped_early': stopped_early,
+        'unmatched_choices': unmatched,
+    }
+
+def prefix_cache_hit_rate(requests, prefix_length):
+    """
+    Estimated share of a shared prompt prefix that the server took from its prompt cache.
+
+    Ollama's `prompt_eval_count` only counts the prompt tokens it had to
+    evaluate, so a request that reused the cached prefix reports fewer tokens
+    than its prompt holds. Tokens per character are calibrated on the request
+    with the most tokens per character, i.e. one that evaluated its whole
+    prompt (normally the first request of the task).
+
+    Args:
+        requests: `(prompt length in characters, prompt_eval_count)` pairs of
+            the requests the server answered.
+        prefix_length: Length of the shared prefix in characters.
+
+    Returns:
+        The hit rate between 0 and 1, or None without requests.
+    """
+    requests = [(length, count) for length, count in requests if length]
+    if not requests or not prefix_length:
+        return None
+    tokens_per_char = max(count / length for length, count in requests)
+    prefix_tokens = tokens_per_char * prefix_length
+    reused = sum(min(prefix_tokens, max(0.0, tokens_per_char * length - count)) for length, count in requests)
+    return reused / (prefix_tokens * len(requests))
+
+def format_metrics(metrics):
+    """One-line human readable form of `summarize_requests` output."""
+    def fmt(value, unit='', digits=2):
+        return 'n/a' if value is None else f"{value:.{digits}f}{unit}"
+
+    line = (
+        f"latency p50/p95/p99: {fmt(metrics['latency_p50'], 's', 3)}/{fmt(metrics['latency_p95'], 's', 3)}/{fmt(metrics['latency_p99'], 's', 3)}, "
+        f"prompt: {fmt(metrics['prompt_tokens_per_sec'])} tok/s, "
+        f"generation: {fmt(metrics['generation_tokens_per_sec'])} tok/s, "
+        f"model load: {metrics['load_seconds']:.2f}s, "
+        f"cache hits: {metrics['cache_hits']}/{metrics['requests']}, "
+        f"retries: {metrics.get('retries', 0)}"
+    )
+    if metrics.get('deduplicated'):
+        line += f", deduplicated: {metrics['deduplicated']}"
+    if metrics.get('stopped_early'):
+        line += f", stopped early: {metrics['stopped_early']}"
+    if metrics.get('unmatched_choices'):
+        line += f", unmatched choices: {metrics['unmatched_choices']}"
+    if metrics.get('prefix_cache_hit_rate') is not None:
+        line += f", prefix cache hits: {metrics['prefix_cache_hit_rate']:.0%}"
+    return line
+
+def format_comparison(results):
+    """
+    Markdown table comparing models across tasks.
+
+    Args:
+        results: Dict mapping model name to a dict of task name to the result
+            returned by `run_task`.
+
+    Returns:
+        Table with one row per task and one column per model, each cell holding
+        accuracy and median request latency.
+    """
+    models = list(results)
+    tasks = []
+    for model_results in results.values():
+        tasks += [task for task in model_results if task not in tasks]
+
+    lines = [
+        '| Task | ' + ' | '.join(models) + ' |',
+        '|---|' + '---|' * len(models),
+    ]
+    for task in tasks:
+        cells = []
+        for model in models:
+            result = results[model].get(task)
+            if result is None:
+                cells.append('-')
+                continue
+            p50 = result['metrics']['latency_p50']
+            cells.append(f"{result['accuracy']:.2f}% ({'n/a' if p50 is None else f'{p50:.2f}s'})")
+        lines.append(f"| {task} | " + ' | '.join(cells) + ' |')
+    return '\n'.join(lines)
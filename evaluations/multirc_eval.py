@@ -1,33 +1,25 @@
 # evaluations/multirc_eval.py
 
-from datasets import load_dataset
-from tqdm import tqdm
 import re
 
-def evaluate_multirc(model, sample_size=None):
+from evaluations.extractors import KeywordExtractor
+from evaluations.registry import register_task
+from evaluations.runner import run_task
+from evaluations.task import Task
+
+def evaluate_multirc(model, sample_size=None, run=None):
     """
     Evaluate the model on the MultiRC dataset.
 
     Args:
-        model: The model object with a `chat` method.
+        model: The model object with a `chat_many` method.
         sample_size: Number of samples to use for evaluation (default is the entire dataset).
+        run: Optional RunLog to record per-example results in and resume from.
     """
-    multirc_dataset = load_dataset("super_glue", "multirc", split="validation")
-
-    # If sample_size is provided, select a subset of the dataset
-    if sample_size:
-        multirc_dataset = multirc_dataset.select(range(min(sample_size, len(multirc_dataset))))
-
-    correct = 0
-    total = 0
+    return run_task(model, TASK, sample_size=sample_size, run=run)['accuracy']
 
-    for idx, example in enumerate(tqdm(multirc_dataset, desc="Evaluating MultiRC")):
-        paragraph = example['paragraph']
-        question = example['question']
-        answer = example['answer']
-        correct_label = bool(example['label'])  # Convert label to boolean
-
-        prompt = f"""
+def create_multirc_prompt(paragraph, question, answer):
+    prompt = f"""
 Paragraph:
 {paragraph}
 
@@ -37,35 +29,52 @@ Proposed Answer: {answer}
 Is the proposed answer correct based on the paragraph? Please answer 'Yes' or 'No'.
 
 Answer:""".strip()
+    return prompt
 
-        try:
-            response = model.chat(prompt)
-            predicted_label = extract_multirc_answer(response)
+def create_multirc_group_prompt(paragraph, items):
+    items_str = '\n\n'.join([f"{i}. Question: {question}\n   Proposed Answer: {answer}" for i, (question, answer) in enumerate(items, 1)])
+    prompt = f"""
+Paragraph:
+{paragraph}
+
+{items_str}
 
-            if predicted_label is not None:
-                if predicted_label == correct_label:
-                    correct += 1
-                total += 1
-            else:
-                print(f"Warning: Invalid response from model: {response}")
-                total += 1  # Count as incorrect
+For each numbered item, is the proposed answer correct based on the paragraph? Reply with one line per item in the form '<number>. Yes' or '<number>. No'.
 
-        except Exception as e:
-            print(f"Error processing example {idx}: {e}")
-            continue
+Answers:""".strip()
+    return prompt
 
-    accuracy = correct / total * 100 if total > 0 else 0
-    print(f"MultiRC Accuracy: {accuracy:.2f}%")
-    return accuracy
+def split_numbered_response(response, count):
+    """Return the reply line of each numbered item 1..count ('' if the item is missing)."""
+    parts = [''] * count
+    for match in re.finditer(r'^\W*(\d+)\s*[.):-]?\s*(.*)$', response, re.M):
+        number = int(match.group(1))
+        if 1 <= number <= count and not parts[number - 1]:
+            parts[number - 1] = match.group(2)
+    return parts
+
+EXTRACTOR = KeywordExtractor([
+    (True, ['yes', 'yeah', 'yep', 'correct', 'true', 'affirmative']),
+    (False, ['no', 'nope', 'nah', 'false', 'negative', 'incorrect']),
+])
 
 def extract_multirc_answer(response):
-    response = response.strip().lower()
-    # Remove punctuation
-    response = response.strip('.,"\' ')
-    # Check for affirmative or negative responses
-    if any(word in response for word in ['yes', 'yeah', 'yep', 'correct', 'true', 'affirmative']):
-        return True
-    elif any(word in response for word in ['no', 'nope', 'nah', 'false', 'negative', 'incorrect']):
-        return False
-    else:
-        return None
+    return EXTRACTOR(response)
+
+TASK = register_task(Task(
+    name='multirc',
+    display_name='MultiRC',
+    dataset=("super_glue", "multirc"),
+    build_prompt=lambda example: create_multirc_prompt(example['paragraph'], example['question'], example['answer']),
+    extract=EXTRACTOR,
+    label=lambda example: bool(example['label']),  # Convert label to boolean
+    answer=lambda example: 'Yes' if example['label'] else 'No',
+    answer_values=lambda example: {'Yes': True, 'No': False},
+    warn_invalid=True,
+    group_key=lambda example: example['paragraph'],
+    build_group_prompt=lambda examples: create_multirc_group_prompt(examples[0]['paragraph'], [(example['question'], example['answer']) for example in examples]),
+    split_group_response=split_numbered_response,
+    answer_pattern=re.compile(r"\b(?:yes|no|true|false)\b(?=\W)", re.IGNORECASE),
+    max_tokens=8,
+    stop=['\n'],
+))
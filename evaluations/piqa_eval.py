@@ -1,60 +1,49 @@
 # evaluations/piqa_eval.py
 
-from datasets import load_dataset
-from tqdm import tqdm
+import re
 
-def evaluate_piqa(model, sample_size=None):
+from evaluations.extractors import KeywordExtractor
+from evaluations.registry import register_task
+from evaluations.runner import run_task
+from evaluations.task import Task
+
+def evaluate_piqa(model, sample_size=None, run=None):
     """
     Evaluate the model on the PIQA dataset.
 
     Args:
-        model: The model object with a `chat` method.
+        model: The model object with a `chat_many` method.
         sample_size: Number of samples to use for evaluation (default is entire dataset).
+        run: Optional RunLog to record per-example results in and resume from.
     """
-    piqa_dataset = load_dataset("piqa", split="validation")
-
-    # If sample_size is provided, select a subset of the dataset
-    if sample_size:
-        piqa_dataset = piqa_dataset.select(range(min(sample_size, len(piqa_dataset))))
-
-    correct = 0
-    total = 0
-
-    for idx, example in enumerate(tqdm(piqa_dataset, desc="Evaluating PIQA")):
-        goal = example['goal']
-        solution1 = example['sol1']
-        solution2 = example['sol2']
-        correct_answer = example['label']
+    return run_task(model, TASK, sample_size=sample_size, run=run)['accuracy']
 
-        prompt = f"""
+def create_piqa_prompt(goal, solution1, solution2):
+    prompt = f"""
 Goal: {goal}
 Solution 1: {solution1}
 Solution 2: {solution2}
 Which solution is more plausible, Solution 1 or Solution 2?
 
 Answer:""".strip()
+    return prompt
 
-        try:
-            response = model.chat(prompt)
-            predicted_answer = extract_piqa_answer(response)
-
-            if predicted_answer == correct_answer:
-                correct += 1
-            total += 1
-
-        except Exception as e:
-            print(f"Error processing example {idx}: {e}")
-            continue
-
-    accuracy = correct / total * 100 if total > 0 else 0
-    print(f"PIQA Accuracy: {accuracy:.2f}%")
-    return accuracy
+EXTRACTOR = KeywordExtractor([(0, ['solution 1']), (1, ['solution 2'])])
 
 def extract_piqa_answer(response):
-    response = response.strip().lower()
-    if 'solution 1' in response:
-        return 0
-    elif 'solution 2' in response:
-        return 1
-    else:
-        return None
+    return EXTRACTOR(response)
+
+TASK = register_task(Task(
+    name='piqa',
+    display_name='PIQA',
+    dataset=("piqa",),
+    build_prompt=lambda example: create_piqa_prompt(example['goal'], example['sol1'], example['sol2']),
+    extract=EXTRACTOR,
+    label=lambda example: example['label'],
+    answer=lambda example: f"Solution {example['label'] + 1}",
+    choices=lambda example: {'1': 0, '2': 1},
+    answer_values=lambda example: {'Solution 1': 0, 'Solution 2': 1},
+    answer_pattern=re.compile(r"\bsolution [12]\b(?=\W)", re.IGNORECASE),
+    max_tokens=12,
+    stop=['\n'],
+))
@@ -0,0 +1,192 @@
+# evaluations/planner.py
+
+import glob
+import json
+import os
+
+from evaluations.extractors import answer_schema
+from evaluations.runner import (STRUCTURED_MAX_TOKENS, create_choice_prompt, create_structured_prompt, estimate_tokens, group_indices,
+                                shard_indices)
+
+def request_prompts(task, data, scoring='generate', group_prompts=False, shard=None):
+    """
+    Texts of the requests `run_task` would send for `data`, one per request.
+
+    Returns `(prompts, max_tokens)`, where `max_tokens` is the cap on
+    generated tokens of every request, or None when replies are not capped.
+    """
+    indices = shard_indices(data, task, shard)
+    if scoring == 'choice' and task.choices is not None:
+        return [create_choice_prompt(data.prompts[idx], list(task.choices(data.examples[idx]))) for idx in indices], 1
+    if scoring == 'structured' and task.answer_values is not None:
+        prompts = []
+        for idx in indices:
+            values = task.answer_values(data.examples[idx])
+            # The schema travels in `format`; Ollama adds it to the prompt it evaluates
+            prompts.append(create_structured_prompt(data.prompts[idx], values) + json.dumps(answer_schema(values)))
+        return prompts, STRUCTURED_MAX_TOKENS
+    if group_prompts and task.build_group_prompt is not None:
+        groups = group_indices(data, indices, task.group_key)
+        return [data.prefix + task.build_group_prompt([data.examples[idx] for idx in group]) for group in groups], None
+    return [data.prompts[idx] for idx in indices], None
+
+def load_tokenizer(name):
+    """The Hugging Face tokenizer `name` (a model ID or local path)."""
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        raise ImportError("Counting tokens with --tokenizer needs transformers: pip install transformers") from None
+    return AutoTokenizer.from_pretrained(name)
+
+def count_tokens(prompts, tokenizer=None):
+    """
+    Prompt tokens of each of `prompts`, sent as a single user message.
+
+    With a `tokenizer`, prompts are rendered with its chat template (when it
+    has one) and counted exactly; without one, `estimate_tokens` is used.
+    """
+    if tokenizer is None:
+        return [round(estimate_tokens(prompt)) for prompt in prompts]
+    if getattr(tokenizer, 'chat_template', None):
+        prompts = [tokenizer.apply_chat_template([{'role': 'user', 'content': prompt}], tokenize=False, add_generation_prompt=True) for prompt in prompts]
+    return [len(ids) for ids in tokenizer(prompts, add_special_tokens=False)['input_ids']]
+
+def load_history(runs_dir, model_name=None):
+    """
+    Task results of the reports in `runs_dir`, as `(metadata, task_name, result)`
+    triples, optionally only those of `model_name`.
+    """
+    history = []
+    for path in sorted(glob.glob(os.path.join(runs_dir, '*.report.json'))):
+        try:
+            with open(path, encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if model_name is not None and report.get('model') != model_name:
+            continue
+        for task_name, result in (report.get('tasks') or {}).items():
+            if result.get('metrics'):
+                history.append((report, task_name, result))
+    return history
+
+def _sent(metrics):
+    # Requests whose server counters were recorded; cache hits, deduplicated
+    # and cancelled streamed requests report none
+    return metrics['requests'] - metrics.get('cache_hits', 0) - metrics.get('deduplicated', 0) - metrics.get('stopped_early', 0)
+
+def _seconds(metrics, prompt_rate, generation_rate):
+    # Server time of a task's requests, one after another
+    return metrics['prompt_tokens'] / prompt_rate + metrics['generated_tokens'] / generation_rate
+
+class Throughput:
+    """
+    Serving speed of a model, measured by its previous runs.
+
+    Attributes:
+        prompt_rate: Prompt tokens per second of a single request.
+        generation_rate: Generated tokens per second of a single request.
+        efficiency: Share of the requested concurrency that turned into
+            speed-up, from runs that recorded their concurrency (1 if none did).
+        runs: Number of task results the rates come from.
+    """
+
+    def __init__(self, history):
+        measured = [(report, result['metrics']) for report, _, result in history
+                    if result['metrics'].get('prompt_tokens_per_sec') and result['metrics'].get('generation_tokens_per_sec')]
+        self.runs = len(measured)
+        self.prompt_rate = self.generation_rate = None
+        self.efficiency = 1.0
+        if not measured:
+            return
+        prompt_tokens = sum(metrics['prompt_tokens'] for _, metrics in measured)
+        generated_tokens = sum(metrics['generated_tokens'] for _, metrics in measured)
+        self.prompt_rate = prompt_tokens / sum(metrics['prompt_tokens'] / metrics['prompt_tokens_per_sec'] for _, metrics in measured)
+        self.generation_rate = generated_tokens / sum(metrics['generated_tokens'] / metrics['generation_tokens_per_sec'] for _, metrics in measured)
+
+        serial = parallel = 0.0
+        for report, _, result in history:
+            metrics = result['metrics']
+            concurrency = report.get('concurrency')
+            # Cached replies and early stops make the wall time say little about the server
+            if not concurrency or metrics.get('cache_hits') or not result.get('elapsed_seconds') or not metrics.get('prompt_tokens_per_sec'):
+                continue
+            serial += _seconds(metrics, self.prompt_rate, self.generation_rate)
+            parallel += result['elapsed_seconds'] * min(concurrency, max(1, _sent(metrics)))
+        if serial and parallel:
+            self.efficiency = min(1.0, serial / parallel)
+
+def generation_per_request(history, task_name, scoring, model_name, max_tokens=None):
+    """
+    Mean generated tokens per request of `task_name` with `scoring`, from
+    `history`: `(tokens, source)`, preferring runs of `model_name`, then of
+    any model, then the per-request cap `max_tokens`, then the mean over all
+    tasks `model_name` ran. `(None, None)` if nothing is known.
+    """
+    def mean(matches):
+        generated = sent = 0
+        for report, name, result in history:
+            if report.get('scoring', 'generate') == scoring and matches(report, name):
+                generated += result['metrics']['generated_tokens']
+                sent += _sent(result['metrics'])
+        return generated / sent if sent else None
+
+    for source, matches in (('model history', lambda report, name: name == task_name and report.get('model') == model_name),
+                            ('other models', lambda report, name: name == task_name)):
+        tokens = mean(matches)
+        if tokens is not None:
+            return tokens, source
+    if max_tokens is not None:
+        return max_tokens, 'cap'
+    tokens = mean(lambda report, name: report.get('model') == model_name)
+    return (tokens, 'other tasks') if tokens is not None else (None, None)
+
+def plan_task(task, prompts, prompt_tokens, generation, throughput, concurrency):
+    """
+    Estimate of one task's tokens and wall time.
+
+    Args:
+        task: The Task.
+        prompts: Texts of its requests (see `request_prompts`).
+        prompt_tokens: Prompt tokens of each request (see `count_tokens`).
+        generation: Mean generated tokens per request, or None if unknown.
+        throughput: Throughput of the model.
+        concurrency: Requests in flight at once.
+    """
+    requests = len(prompts)
+    total_prompt = sum(prompt_tokens)
+    total_generated = None if generation is None else generation * requests
+    seconds = None
+    if total_generated is not None and throughput.prompt_rate:
+        serial = total_prompt / throughput.prompt_rate + total_generated / throughput.generation_rate
+        seconds = serial / max(1.0, min(concurrency, requests) * throughput.efficiency)
+    return {
+        'task': task.name,
+        'requests': requests,
+        'prompt_tokens': total_prompt,
+        'max_prompt_tokens': max(prompt_tokens, default=0),
+        'generated_tokens': total_generated,
+        'seconds': seconds,
+    }
+
+def format_duration(seconds):
+    if seconds is None:
+        return 'n/a'
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+def format_plan(plans, sources):
+    """Markdown table of task plans (see `plan_task`), with a total row; `sources` names where each task's generation estimate came from."""
+    lines = ['| Task | Requests | Prompt tokens | Longest prompt | Generated tokens | Est. wall time |', '|---|---|---|---|---|---|']
+    for plan in plans:
+        generated = 'n/a' if plan['generated_tokens'] is None else f"{plan['generated_tokens']:,.0f} ({sources[plan['task']]})"
+        lines.append(f"| {plan['task']} | {plan['requests']:,} | {plan['prompt_tokens']:,} | {plan['max_prompt_tokens']:,} | {generated} | {format_duration(plan['seconds'])} |")
+    known = [plan['seconds'] for plan in plans if plan['seconds'] is not None]
+    generated = [plan['generated_tokens'] for plan in plans if plan['generated_tokens'] is not None]
+    total_seconds = format_duration(sum(known)) + ('' if len(known) == len(plans) else ' (partial)')
+    lines.append(f"| **Total** | {sum(plan['requests'] for plan in plans):,} | {sum(plan['prompt_tokens'] for plan in plans):,} | "
+                 f"{max((plan['max_prompt_tokens'] for plan in plans), default=0):,} | {sum(generated):,.0f} | {total_seconds} |")
+    return '\n'.join(lines)
@@ -0,0 +1,113 @@
+# evaluations/prompt_store.py
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+from evaluations.runner import LABEL_COLUMN, PROMPT_COLUMN, load_task_dataset
+
+def task_fingerprint(task):
+    """Hash of the module defining `task`, so prompts rendered by an older version are detected."""
+    module = sys.modules[task.build_prompt.__module__]
+    with open(module.__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class PromptStore:
+    """
+    Local, memory-mapped copy of each task's evaluation split.
+
+    `prepare` downloads a task's split once and saves it as Arrow files next to
+    two extra columns: the rendered prompt and the JSON-encoded gold label.
+    Evaluation runs then open the split with `load` straight from disk (no
+    network access, no dataset resolution, no prompt rendering). With
+    `train=True`, the task's train split is stored too, for drawing few-shot
+    exemplars offline. A `manifest.json` in the store directory lists the
+    prepared tasks.
+
+    Args:
+        path: Directory of the store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest_path = os.path.join(path, 'manifest.json')
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'tasks': {}}
+
+    def _task_dir(self, task):
+        return os.path.join(self.path, task.name)
+
+    def _train_dir(self, task):
+        return os.path.join(self.path, f"{task.name}.train")
+
+    def has(self, task):
+        return task.name in self.manifest['tasks']
+
+    def has_train(self, task):
+        return self.manifest['tasks'].get(task.name, {}).get('train_rows') is not None
+
+    def prepare(self, task, sample_size=None, train=False):
+        """Render and save `task`'s split (and its train split with `train`); returns the number of stored rows."""
+        train_rows = None
+        if train:
+            from datasets import load_dataset
+
+            train_dataset = load_dataset(*task.dataset, split=task.train_split)
+            train_dataset.save_to_disk(self._train_dir(task))
+            train_rows = len(train_dataset)
+
+        dataset = load_task_dataset(task, sample_size)
+        prompts = [task.build_prompt(example) for example in dataset]
+        labels = [json.dumps(task.label(example)) for example in dataset]
+        dataset = dataset.add_column(PROMPT_COLUMN, prompts).add_column(LABEL_COLUMN, labels)
+        dataset.save_to_disk(self._task_dir(task))
+
+        self.manifest['tasks'][task.name] = {
+            'dataset': list(task.dataset),
+            'split': task.split,
+            'rows': len(dataset),
+            'sample_size': sample_size,
+            'train_rows': train_rows,
+            'fingerprint': task_fingerprint(task),
+            'prepared': time.time(),
+        }
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        return len(dataset)
+
+    def load(self, task, sample_size=None, seed=None):
+        """
+        Open `task`'s stored split, truncated to `sample_size` rows if given.
+        With a `seed`, rows follow a seeded random permutation of the split.
+
+        If the task module changed since the store was prepared, the stored
+        prompts are dropped so the runner renders them again from the stored
+        examples.
+        """
+        from datasets import load_from_disk
+
+        entry = self.manifest['tasks'][task.name]
+        dataset = load_from_disk(self._task_dir(task))
+        if entry['fingerprint'] != task_fingerprint(task):
+            print(f"Warning: stored prompts for {task.name} are out of date; rendering them again (re-run prepare to refresh).")
+            dataset = dataset.remove_columns([PROMPT_COLUMN, LABEL_COLUMN])
+
+        if seed is not None:
+            dataset = dataset.shuffle(seed=seed)
+        if sample_size:
+            if sample_size > len(dataset) and entry['sample_size']:
+                print(f"Warning: store only holds {len(dataset)} {task.name} examples.")
+            dataset = dataset.select(range(min(sample_size, len(dataset))))
+        return dataset
+
+    def load_train(self, task):
+        """Open `task`'s stored train split."""
+        from datasets import load_from_disk
+
+        return load_from_disk(self._train_dir(task))
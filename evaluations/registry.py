@@ -0,0 +1,61 @@
+# evaluations/registry.py
+
+import importlib
+
+from evaluations.task import Task
+
+# Entry point group under which other packages can add task modules, e.g. in
+# their pyproject.toml: [project.entry-points."ollama_eval.tasks"] mytask = "mypackage.mytask_eval"
+ENTRY_POINT_GROUP = 'ollama_eval.tasks'
+
+# Built-in tasks in their default order, with the module defining each one
+BUILTIN_TASKS = {
+    'boolq': 'evaluations.boolq_eval',
+    'hellaswag': 'evaluations.hellaswag_eval',
+    'winogrande': 'evaluations.winogrande_eval',
+    'rte': 'evaluations.rte_eval',
+    'piqa': 'evaluations.piqa_eval',
+    'commonsenseqa': 'evaluations.commonsenseqa_eval',
+    'multirc': 'evaluations.multirc_eval',
+    'arc': 'evaluations.arc_eval',
+    'cb': 'evaluations.cb_eval',
+}
+
+_tasks = {}
+_entry_points = None
+
+def register_task(task):
+    """
+    Make `task` available by name. Task modules call it on the Task they
+    define (`TASK = register_task(Task(...))`); returns the task.
+    """
+    _tasks[task.name] = task
+    return task
+
+def _plugins():
+    global _entry_points
+    if _entry_points is None:
+        from importlib.metadata import entry_points
+        _entry_points = {entry_point.name: entry_point for entry_point in entry_points(group=ENTRY_POINT_GROUP)}
+    return _entry_points
+
+def task_names():
+    """Names of all available tasks: the built-in ones, then those of installed plugins. Imports no task module."""
+    return list(BUILTIN_TASKS) + [name for name in _plugins() if name not in BUILTIN_TASKS]
+
+def find_task(name):
+    """
+    The Task called `name`, importing its module on first use; None if no
+    built-in task or plugin has that name.
+
+    A plugin entry point names either a module that registers the task, or
+    (as `module:attribute`) the Task itself.
+    """
+    if name not in _tasks:
+        if name in BUILTIN_TASKS:
+            importlib.import_module(BUILTIN_TASKS[name])
+        elif name in _plugins():
+            loaded = _plugins()[name].load()
+            if isinstance(loaded, Task):
+                register_task(loaded)
+    return _tasks.get(name)
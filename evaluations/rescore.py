@@ -0,0 +1,50 @@
+# evaluations/rescore.py
+
+from evaluations.extractors import Extractor, extract_many, read_answer_field
+
+def needs_task_data(task, records, scoring='generate'):
+    """Whether re-scoring `records` needs the task's examples or labels, not just the stored responses."""
+    if scoring == 'choice' and task.choices is not None:
+        return True
+    if scoring == 'structured' and task.answer_values is not None:
+        return True
+    if not isinstance(task.extract, Extractor) or task.extract.uses_examples:
+        return True
+    return any(record.get('label') is None for record in records)
+
+def rescore(task, records, data=None, scoring='generate'):
+    """
+    Extract predictions again from the raw responses of stored example records.
+
+    All responses of the task go through its extractor in one pass. Gold
+    labels come from the records, or from `data` (the run's TaskData) for
+    records written before labels were stored.
+
+    Args:
+        task: The Task the records belong to.
+        records: Example records of one task, as returned by `RunLog.completed`.
+        data: Optional TaskData of the run, needed when `needs_task_data` says so.
+        scoring: The run's scoring mode.
+
+    Returns:
+        `records`, updated in place with the new `prediction` and `correct`
+        (and `label` where it was missing).
+    """
+    # Failed requests stored no response; they stay incorrect
+    responses = [record['response'] or '' for record in records]
+    examples = [data.examples[record['index']] for record in records] if data is not None else [None] * len(records)
+    if scoring == 'choice' and task.choices is not None:
+        predictions = [task.choices(example).get(response) for response, example in zip(responses, examples)]
+    elif scoring == 'structured' and task.answer_values is not None:
+        predictions = [read_answer_field(response, task.answer_values(example)) for response, example in zip(responses, examples)]
+    else:
+        predictions = extract_many(task.extract, responses, examples)
+
+    for record, prediction in zip(records, predictions):
+        if record.get('label') is None:
+            record['label'] = data.labels[record['index']]
+        if record.get('error') is not None:
+            continue
+        record['prediction'] = prediction
+        record['correct'] = prediction == record['label']
+    return records
@@ -1,58 +1,47 @@
 # evaluations/rte_eval.py
 
-from datasets import load_dataset
-from tqdm import tqdm
+import re
 
-def evaluate_rte(model, sample_size=None):
+from evaluations.extractors import KeywordExtractor
+from evaluations.registry import register_task
+from evaluations.runner import run_task
+from evaluations.task import Task
+
+def evaluate_rte(model, sample_size=None, run=None):
     """
     Evaluate the model on the RTE (Recognizing Textual Entailment) dataset.
 
     Args:
-        model: The model object with a `chat` method.
+        model: The model object with a `chat_many` method.
         sample_size: Number of samples to use for evaluation (default is entire dataset).
+        run: Optional RunLog to record per-example results in and resume from.
     """
-    rte_dataset = load_dataset("super_glue", "rte", split="validation")
-
-    # If sample_size is provided, select a subset of the dataset
-    if sample_size:
-        rte_dataset = rte_dataset.select(range(min(sample_size, len(rte_dataset))))
-
-    correct = 0
-    total = 0
-
-    for idx, example in enumerate(tqdm(rte_dataset, desc="Evaluating RTE")):
-        premise = example['premise']
-        hypothesis = example['hypothesis']
-        correct_answer = bool(example['label'])  # 1 for entailment, 0 for contradiction
+    return run_task(model, TASK, sample_size=sample_size, run=run)['accuracy']
 
-        prompt = f"""
+def create_rte_prompt(premise, hypothesis):
+    prompt = f"""
 Premise: {premise}
 Hypothesis: {hypothesis}
 Is the hypothesis entailed by the premise? Please answer 'Yes' or 'No'.
 
 Answer:""".strip()
+    return prompt
 
-        try:
-            response = model.chat(prompt)
-            predicted_answer = extract_rte_answer(response)
-
-            if predicted_answer == correct_answer:
-                correct += 1
-            total += 1
-
-        except Exception as e:
-            print(f"Error processing example {idx}: {e}")
-            continue
-
-    accuracy = correct / total * 100 if total > 0 else 0
-    print(f"RTE Accuracy: {accuracy:.2f}%")
-    return accuracy
+EXTRACTOR = KeywordExtractor([(True, ['yes']), (False, ['no'])])
 
 def extract_rte_answer(response):
-    response = response.strip().lower()
-    if 'yes' in response:
-        return True
-    elif 'no' in response:
-        return False
-    else:
-        return None
+    return EXTRACTOR(response)
+
+TASK = register_task(Task(
+    name='rte',
+    display_name='RTE',
+    dataset=("super_glue", "rte"),
+    build_prompt=lambda example: create_rte_prompt(example['premise'], example['hypothesis']),
+    extract=EXTRACTOR,
+    label=lambda example: example['label'] == 0,  # 0: entailment, 1: not entailment
+    answer=lambda example: 'Yes' if example['label'] == 0 else 'No',
+    answer_values=lambda example: {'Yes': True, 'No': False},
+    answer_pattern=re.compile(r"\b(?:yes|no)\b(?=\W)", re.IGNORECASE),
+    max_tokens=8,
+    stop=['\n'],
+))
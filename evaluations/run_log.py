@@ -0,0 +1,122 @@
+# evaluations/run_log.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+class RunLog:
+    """
+    Append-only JSONL record of an evaluation run.
+
+    Every scored example is written as one line as soon as it completes, so
+    a crashed or interrupted run can be resumed from the same file: finished
+    indices are skipped and accuracy is rebuilt from the stored records.
+
+    Args:
+        run_id: Identifier of the run; the file is `<runs_dir>/<run_id>.jsonl`.
+        runs_dir: Directory holding run files.
+        metadata: Run settings (model, sample size, ...) written once when the
+            file is created.
+    """
+
+    def __init__(self, run_id, runs_dir='results/runs', metadata=None):
+        self.run_id = run_id
+        self.path = os.path.join(runs_dir, f"{run_id}.jsonl")
+        self.report_path = os.path.join(runs_dir, f"{run_id}.report.json")
+        self.metadata = {}
+        self._completed = {}
+        # Tasks evaluated side by side record into the same file
+        self._lock = threading.Lock()
+
+        os.makedirs(runs_dir, exist_ok=True)
+        if os.path.exists(self.path):
+            self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if not self.metadata:
+            self.metadata = dict(metadata or {}, run_id=run_id, started=time.time())
+            self._write(dict(self.metadata, type='run'))
+
+    @staticmethod
+    def new_run_id():
+        return time.strftime('%Y%m%d-%H%M%S')
+
+    @staticmethod
+    def model_run_id(run_id, model_name):
+        """ID of the run file holding `model_name`'s results within run `run_id`."""
+        safe_name = ''.join(c if c.isalnum() or c in '-_.' else '-' for c in model_name)
+        return f"{run_id}-{safe_name}"
+
+    @staticmethod
+    def exists(run_id, runs_dir='results/runs'):
+        return os.path.exists(os.path.join(runs_dir, f"{run_id}.jsonl"))
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a truncated final line; that example is re-run
+                    continue
+                if record.get('type') == 'run':
+                    self.metadata = record
+                elif record.get('type') == 'example':
+                    self._completed.setdefault(record['task'], {})[record['index']] = record
+
+    def _write(self, record):
+        line = json.dumps(record) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def tasks(self):
+        """Names of the tasks with recorded examples."""
+        return list(self._completed)
+
+    def completed(self, task):
+        """Return the stored records of `task`, keyed by dataset index."""
+        return self._completed.get(task, {})
+
+    def record(self, task, index, prompt, response, prediction, correct, latency, stats=None, label=None, error=None):
+        record = {
+            'type': 'example',
+            'task': task,
+            'index': index,
+            'prompt_hash': hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+            'response': response,
+            'prediction': prediction,
+            'label': label,
+            'correct': bool(correct),
+            'latency': latency,
+            'stats': stats or {},
+        }
+        if error is not None:
+            # The request failed; a resumed run tries this example again
+            record['error'] = error
+        self._write(record)
+        self._completed.setdefault(task, {})[index] = record
+
+    def merge(self, other):
+        """Copy the example records of RunLog `other` that this run does not hold yet; returns how many were copied."""
+        copied = 0
+        for task, records in other._completed.items():
+            for index, record in records.items():
+                if index not in self.completed(task):
+                    self._write(record)
+                    self._completed.setdefault(task, {})[index] = record
+                    copied += 1
+        return copied
+
+    def write_report(self, results):
+        """Write the per-task results of this run to `<run_id>.report.json` next to the run file."""
+        report = dict(self.metadata, type='report', finished=time.time(), tasks=results)
+        with open(self.report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,420 @@
+# evaluations/runner.py
+
+import json
+import time
+
+from evaluations.extractors import ANSWER_FIELD, answer_schema, read_answer_field
+from evaluations.metrics import format_metrics, prefix_cache_hit_rate, summarize_requests, wilson_interval
+
+SCORING_MODES = ['generate', 'choice', 'structured']
+
+# Orders in which a task's requests can be dispatched (see `dispatch_order`)
+ORDER_POLICIES = ['dataset', 'longest-first', 'binned']
+
+# Length bins of the 'binned' order
+ORDER_BINS = 8
+
+# Rough characters per token, for estimating the cost of a prompt before sending it
+CHARS_PER_TOKEN = 4
+
+# Cap on generated tokens of a structured reply, which only holds a short JSON object
+STRUCTURED_MAX_TOKENS = 32
+
+# Fewest scored examples before a confidence-interval stop is allowed
+MIN_EARLY_STOP_SAMPLES = 30
+
+# Columns added by evaluations.prompt_store to prepared splits
+PROMPT_COLUMN = '__prompt'
+LABEL_COLUMN = '__label'
+
+# Default seed of the few-shot exemplar draw
+FEWSHOT_SEED = 1234
+
+def load_task_dataset(task, sample_size=None, seed=None):
+    """
+    Load the evaluation split of `task`, truncated to `sample_size` rows if given.
+
+    With a `seed`, rows are drawn from a seeded random permutation of the split
+    instead of taking its first rows.
+    """
+    # Imported on use: `datasets` alone takes about a second to import
+    from datasets import load_dataset
+
+    dataset = load_dataset(*task.dataset, split=task.split)
+    if seed is not None:
+        dataset = dataset.shuffle(seed=seed)
+
+    # If sample_size is provided, select a subset of the dataset
+    if sample_size:
+        dataset = dataset.select(range(min(sample_size, len(dataset))))
+    return dataset
+
+def load_fewshot_examples(task, count, seed=FEWSHOT_SEED, store=None):
+    """Draw `count` exemplars from `task`'s train split with a seeded shuffle (from `store` when it holds the split)."""
+    if store is not None and store.has_train(task):
+        dataset = store.load_train(task)
+    else:
+        from datasets import load_dataset
+
+        dataset = load_dataset(*task.dataset, split=task.train_split)
+    dataset = dataset.shuffle(seed=seed)
+    return list(dataset.select(range(min(count, len(dataset)))))
+
+def fewshot_prefix(task, exemplars):
+    """
+    Text of the solved `exemplars`, put in front of every prompt of the task.
+
+    The prefix is the same for all of a task's examples, so after the first
+    request the server can take it from its prompt cache instead of
+    evaluating it again.
+    """
+    return ''.join(f"{task.build_prompt(example)} {task.answer(example)}\n\n" for example in exemplars)
+
+class TaskData:
+    """
+    A task's evaluation split, loaded and rendered once.
+
+    Holds the examples, their prompts and gold labels, so several runs (for
+    example one per model) can share a single load and prompt rendering.
+
+    Args:
+        task: The Task to load.
+        sample_size: Number of samples to use (default is entire dataset).
+        store: Optional PromptStore; prepared tasks are read from it with their
+            pre-rendered prompts and labels instead of being downloaded.
+        seed: Optional seed; examples follow a seeded random permutation of the
+            split instead of dataset order.
+        examples: Optional list of examples to use instead of loading the split
+            (e.g. synthetic data for benchmarks).
+        num_fewshot: Number of solved train examples put in front of every
+            prompt (see `fewshot_prefix`).
+        fewshot_seed: Seed of the exemplar draw.
+        fewshot_examples: Optional exemplars to use instead of drawing them
+            from the train split.
+    """
+
+    def __init__(self, task, sample_size=None, store=None, seed=None, examples=None, num_fewshot=0, fewshot_seed=FEWSHOT_SEED,
+                 fewshot_examples=None):
+        self.task = task
+        columns = []
+        if examples is None:
+            if store is not None and store.has(task):
+                dataset = store.load(task, sample_size, seed=seed)
+            else:
+                dataset = load_task_dataset(task, sample_size, seed=seed)
+            examples, columns = dataset, dataset.column_names
+        elif sample_size:
+            examples = examples[:sample_size]
+
+        self.examples = list(examples)
+        if PROMPT_COLUMN in columns:
+            self.prompts = [example[PROMPT_COLUMN] for example in self.examples]
+            self.labels = [json.loads(example[LABEL_COLUMN]) for example in self.examples]
+        else:
+            self.prompts = [task.build_prompt(example) for example in self.examples]
+            self.labels = [task.label(example) for example in self.examples]
+
+        self.prefix = ''
+        if num_fewshot:
+            if task.answer is None:
+                raise ValueError(f"Task {task.name} does not support few-shot prompts")
+            if fewshot_examples is None:
+                fewshot_examples = load_fewshot_examples(task, num_fewshot, fewshot_seed, store)
+            self.prefix = fewshot_prefix(task, fewshot_examples[:num_fewshot])
+            self.prompts = [self.prefix + prompt for prompt in self.prompts]
+
+    def __len__(self):
+        return len(self.examples)
+
+def create_choice_prompt(prompt, tokens):
+    """Ask for the bare answer token, placing the instruction before the final 'Answer:' cue."""
+    instruction = f"Reply with only {', '.join(tokens[:-1])} or {tokens[-1]}." if len(tokens) > 1 else f"Reply with only {tokens[0]}."
+    body, cue, _ = prompt.rpartition('Answer:')
+    if not cue:
+        return f"{prompt}\n{instruction}"
+    return f"{body.rstrip()}\n{instruction}\n\n{cue}"
+
+def create_structured_prompt(prompt, values):
+    """Ask for a JSON reply, placing the instruction before the final 'Answer:' cue."""
+    allowed = ', '.join(f'"{value}"' for value in values)
+    instruction = f'Reply in JSON with the field "{ANSWER_FIELD}" set to one of {allowed}.'
+    body, cue, _ = prompt.rpartition('Answer:')
+    if not cue:
+        return f"{prompt}\n{instruction}"
+    return f"{body.rstrip()}\n{instruction}\n\n{cue}"
+
+def group_indices(data, indices, group_key):
+    """Split example indices into groups sharing a context, in order of first appearance."""
+    groups = {}
+    for idx in indices:
+        groups.setdefault(group_key(data.examples[idx]), []).append(idx)
+    return list(groups.values())
+
+def shard_indices(data, task, shard):
+    """
+    Indices of the examples in `shard`, an `(index, count)` pair, or all of them if None.
+
+    Examples are dealt round-robin over the shards; for tasks with a
+    `group_key`, whole groups are dealt so a passage stays on one worker.
+    """
+    indices = range(len(data))
+    if shard is None:
+        return list(indices)
+    index, count = shard
+    if task.group_key is None:
+        return [idx for idx in indices if idx % count == index]
+    groups = group_indices(data, indices, task.group_key)
+    return sorted(idx for i, group in enumerate(groups) if i % count == index for idx in group)
+
+def _starts(sizes):
+    # Position of the first result of each unit among all results
+    starts = [0]
+    for size in sizes:
+        starts.append(starts[-1] + size)
+    return starts
+
+def _expand_group_responses(task, groups, responses):
+    # One response answers a whole group; hand each example its own part
+    starts = _starts(len(group) for group in groups)
+    for position, (response, error, latency, stats) in responses:
+        group = groups[position]
+        parts = [None] * len(group) if error is not None else task.split_group_response(response, len(group))
+        for i, part in enumerate(parts):
+            # Attribute the request's counters to the first example only
+            yield starts[position] + i, (part, error, latency, stats if i == 0 else {})
+
+def estimate_tokens(prompt):
+    """Rough token count of `prompt`, without a tokenizer."""
+    return len(prompt) / CHARS_PER_TOKEN
+
+def dispatch_order(costs, policy='dataset', bins=ORDER_BINS):
+    """
+    Positions of the requests in the order they are sent, given their estimated `costs`.
+
+    'dataset' keeps the given order. 'longest-first' sends the most expensive
+    requests first, so no long request is left running alone at the end of
+    the task while the other slots idle. 'binned' splits the requests into
+    `bins` bins of similar cost and sends the most expensive bin first,
+    keeping the given order within a bin, so requests in flight together
+    have similar lengths.
+    """
+    positions = range(len(costs))
+    if policy == 'longest-first':
+        return sorted(positions, key=lambda position: -costs[position])
+    if policy == 'binned':
+        ranked = sorted(positions, key=costs.__getitem__)
+        bin_of = {position: rank * bins // len(costs) for rank, position in enumerate(ranked)}
+        return sorted(positions, key=lambda position: -bin_of[position])
+    return list(positions)
+
+def _dispatch(send, units, costs, sizes=None, order='dataset', prime=False):
+    # Send `units` (prompts or groups of prompts) in the order picked by
+    # `order` and yield each result (`sizes[i]` per unit, default 1) in that
+    # same dispatch order, with its position in the original order. The model
+    # hands results back in the order sent (see `ModelWrapper.chat_many`), so
+    # a result waits only for the requests sent before it, not for earlier
+    # dataset indices
+    sequence = dispatch_order(costs, order)
+    results = _primed(send, [units[unit] for unit in sequence], prime)
+    starts = _starts(sizes or [1] * len(units))
+    positions = (starts[unit] + i for unit in sequence for i in range(starts[unit + 1] - starts[unit]))
+    try:
+        yield from zip(positions, results)
+    finally:
+        results.close()
+
+def _primed(send, items, prime):
+    # With `prime`, the first request goes out alone, so the shared few-shot
+    # prefix is in the server's prompt cache before the others arrive
+    if not prime:
+        yield from send(items)
+        return
+    yield from send(items[:1])
+    yield from send(items[1:])
+
+def run_task(model, task, sample_size=None, run=None, scoring='generate', group_prompts=False, store=None, data=None,
+             ci_width=None, time_budget=None, confidence=0.95, stream=False, shard=None, order='dataset', progress=None):
+    """
+    Evaluate the model on a single task.
+
+    Args:
+        model: The model object with a `chat_many` method.
+        task: The Task to evaluate.
+        sample_size: Number of samples to use for evaluation (default is entire dataset).
+        run: Optional RunLog to record per-example results in and resume from.
+        scoring: 'generate' parses a free-text answer with the task's extractor;
+            'choice' asks for a single answer token (see `ModelWrapper.choose`);
+            'structured' constrains the reply to a JSON object whose one field
+            is one of the task's `answer_values` (see `ModelWrapper.chat`).
+            Tasks without answer choices or values use 'generate'.
+        group_prompts: For tasks that support it, answer all examples sharing a
+            context (e.g. a MultiRC paragraph) with a single request.
+        store: Optional PromptStore; prepared tasks are read from it with their
+            pre-rendered prompts and labels instead of being downloaded.
+        data: Optional TaskData already loaded for `task`; `sample_size` and
+            `store` are ignored when given.
+        ci_width: Stop once the Wilson confidence interval of the accuracy is at
+            most this many percentage points wide. Use with a seeded TaskData so
+            the scored examples are a random sample.
+        time_budget: Stop once the task has run for this many seconds.
+        confidence: Confidence level of the reported interval.
+        stream: Stream free-text replies and cancel each one as soon as the
+            task's `answer_pattern` matches or a stop sequence follows some
+            text (see `Task.reply_complete`), with the task's token cap applied.
+        shard: Optional `(index, count)` pair; only the examples of that shard
+            are evaluated (see `shard_indices`), and the result covers them only.
+        order: Order in which requests are sent, one of ORDER_POLICIES (see
+            `dispatch_order`). Results are scored and recorded in the order
+            the requests were sent. Only 'dataset' is used with `ci_width` or `time_budget`,
+            which stop on the examples scored so far.
+        progress: Optional function called with `(scored, count)` after each
+            example this call scores, out of `count` it sends; the progress
+            bar is hidden when it is given.
+
+    Returns:
+        Dict with the task name, accuracy in percent, its confidence interval,
+        correct and total counts, the number of examples whose request failed
+        (recorded and counted as incorrect), whether the task stopped early,
+        its wall time in seconds, and request metrics (see `evaluations.metrics.summarize_requests`).
+    """
+    from tqdm import tqdm
+
+    start = time.monotonic()
+    if scoring == 'choice' and task.choices is None:
+        print(f"{task.display_name} has no answer choices; using generate scoring.")
+        scoring = 'generate'
+    if scoring == 'structured' and task.answer_values is None:
+        print(f"{task.display_name} has no answer values; using generate scoring.")
+        scoring = 'generate'
+
+    if data is None:
+        data = TaskData(task, sample_size=sample_size, store=store)
+    if order != 'dataset' and (ci_width is not None or time_budget is not None):
+        # The examples scored so far must be a random sample, not the longest ones
+        print(f"{task.display_name}: early stopping needs requests in dataset order; ignoring order '{order}'.")
+        order = 'dataset'
+
+    completed = run.completed(task.name) if run is not None else {}
+    # Examples whose request failed are tried again
+    completed = {idx: record for idx, record in completed.items() if record.get('error') is None}
+    correct = sum(record['correct'] for record in completed.values())
+    total = len(completed)
+    samples = [(record.get('latency'), record.get('stats')) for record in completed.values()]
+
+    options = stop_when = None
+    if stream:
+        options = task.stream_options()
+        if task.answer_pattern is not None or task.stop:
+            stop_when = task.reply_complete
+
+    pending = [idx for idx in shard_indices(data, task, shard) if idx not in completed]
+    prime = bool(data.prefix)
+    if scoring == 'choice':
+        choices = [list(task.choices(data.examples[idx])) for idx in pending]
+        prompts = [create_choice_prompt(data.prompts[idx], tokens) for idx, tokens in zip(pending, choices)]
+        responses = _dispatch(model.choose_many, list(zip(prompts, choices)), [estimate_tokens(prompt) for prompt in prompts], order=order, prime=prime)
+        extract = lambda response, example: task.choices(example).get(response)
+    elif scoring == 'structured':
+        values = [task.answer_values(data.examples[idx]) for idx in pending]
+        prompts = [create_structured_prompt(data.prompts[idx], answers) for idx, answers in zip(pending, values)]
+        send = lambda requests: model.structured_many(requests, options={'num_predict': STRUCTURED_MAX_TOKENS})
+        requests = [(prompt, answer_schema(answers)) for prompt, answers in zip(prompts, values)]
+        responses = _dispatch(send, requests, [estimate_tokens(prompt) for prompt in prompts], order=order, prime=prime)
+        extract = lambda response, example: read_answer_field(response, task.answer_values(example))
+    elif group_prompts and task.build_group_prompt is not None:
+        groups = group_indices(data, pending, task.group_key)
+        pending = [idx for group in groups for idx in group]
+        group_prompt_texts = [data.prefix + task.build_group_prompt([data.examples[idx] for idx in group]) for group in groups]
+        prompts = [prompt for group, prompt in zip(groups, group_prompt_texts) for _ in group]
+        group_responses = _dispatch(model.chat_many, group_prompt_texts, [estimate_tokens(prompt) for prompt in group_prompt_texts], order=order, prime=prime)
+        responses = _expand_group_responses(task, groups, group_responses)
+        extract = task.extract
+    elif task.group_key is not None:
+        # Send examples that share a context back to back from one worker so
+        # the server can reuse the cached prompt prefix instead of re-encoding it
+        groups = group_indices(data, pending, task.group_key)
+        pending = [idx for group in groups for idx in group]
+        prompts = [data.prompts[idx] for idx in pending]
+        prompt_groups = [[data.prompts[idx] for idx in group] for group in groups]
+        send = lambda prompt_groups: model.chat_groups(prompt_groups, options=options, stop_when=stop_when)
+        costs = [sum(estimate_tokens(prompt) for prompt in group) for group in prompt_groups]
+        responses = _dispatch(send, prompt_groups, costs, sizes=[len(group) for group in groups], order=order, prime=prime)
+        extract = task.extract
+    else:
+        prompts = [data.prompts[idx] for idx in pending]
+        send = lambda prompts: model.chat_many(prompts, options=options, stop_when=stop_when)
+        responses = _dispatch(send, prompts, [estimate_tokens(prompt) for prompt in prompts], order=order, prime=prime)
+        extract = task.extract
+    stopped_early = False
+    errors = scored = 0
+    # (prompt length, prompt_eval_count) of requests the server evaluated, for the prefix cache hit rate
+    evaluated = []
+
+    # Results arrive in dispatch order; records are keyed by example index, so
+    # each is recorded once it and the requests sent before it are done, and a
+    # resumed run skips it
+    for position, (response, error, latency, stats) in tqdm(responses, total=len(pending), desc=f"Evaluating {task.display_name}", disable=progress is not None):
+        idx, prompt = pending[position], prompts[position]
+        example = data.examples[idx]
+        if error is None:
+            try:
+                predicted_answer = extract(response, example)
+            except Exception as e:
+                error = e
+        samples.append((latency, stats))
+        if stats.get('prompt_eval_count'):
+            evaluated.append((len(prompt), stats['prompt_eval_count']))
+        if error is not None:
+            # Recorded and counted as incorrect rather than dropped, so accuracy covers every example
+            print(f"Error processing example {idx}: {error}")
+            predicted_answer = None
+            errors += 1
+        elif predicted_answer is None and task.warn_invalid:
+            print(f"Warning: Invalid response from model: {response}")  # Counted as incorrect
+
+        is_correct = error is None and predicted_answer == data.labels[idx]
+        if is_correct:
+            correct += 1
+        total += 1
+
+        if run is not None:
+            run.record(task.name, idx, prompt, response, predicted_answer, is_correct, latency, stats, label=data.labels[idx],
+                       error=None if error is None else repr(error))
+        scored += 1
+        if progress is not None:
+            progress(scored, len(pending))
+
+        if ci_width is not None and total >= MIN_EARLY_STOP_SAMPLES:
+            low, high = wilson_interval(correct, total, confidence)
+            stopped_early = high - low <= ci_width
+        if time_budget is not None and time.monotonic() - start >= time_budget:
+            stopped_early = True
+        if stopped_early:
+            break
+
+    # Stop dispatching the requests that were still queued
+    responses.close()
+    if stopped_early:
+        print(f"{task.display_name}: stopped early after {total} examples")
+
+    accuracy = correct / total * 100 if total > 0 else 0
+    ci_low, ci_high = wilson_interval(correct, total, confidence)
+    metrics = summarize_requests(samples)
+    if data.prefix:
+        metrics['prefix_cache_hit_rate'] = prefix_cache_hit_rate(evaluated, len(data.prefix))
+    failed = f", {errors} failed" if errors else ''
+    print(f"{task.display_name} Accuracy: {accuracy:.2f}% ({confidence:.0%} CI {ci_low:.2f}-{ci_high:.2f}, n={total}{failed})")
+    print(f"{task.display_name} {format_metrics(metrics)}")
+    return {
+        'task': task.name,
+        'accuracy': accuracy,
+        'ci_low': ci_low,
+        'ci_high': ci_high,
+        'confidence': confidence,
+        'correct': correct,
+        'total': total,
+        'errors': errors,
+        'stopped_early': stopped_early,
+        'elapsed_seconds': time.monotonic() - start,
+        'metrics': metrics,
+    }
@@ -0,0 +1,429 @@
+# evaluations/service.py
+
+import heapq
+import http.client
+import itertools
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from evaluations.registry import find_task, task_names
+from evaluations.run_log import RunLog
+from evaluations.runner import FEWSHOT_SEED, ORDER_POLICIES, SCORING_MODES, TaskData, run_task
+
+# Job settings a client can send, with their defaults
+JOB_DEFAULTS = {
+    'models': None,
+    'evaluations': None,
+    'sample_size': None,
+    'seed': None,
+    'scoring': 'generate',
+    'group_prompts': False,
+    'stream': False,
+    'num_fewshot': 0,
+    'fewshot_seed': FEWSHOT_SEED,
+    'order': 'dataset',
+    'ci_width': None,
+    'time_budget': None,
+    'confidence': 0.95,
+    'priority': 0,
+}
+
+# Least seconds between two progress events of a task
+PROGRESS_INTERVAL = 0.5
+
+# Finished jobs kept for GET /jobs; older ones are forgotten
+KEEP_FINISHED_JOBS = 100
+
+FINISHED = ('done', 'failed')
+
+def job_spec(fields):
+    """Complete and check a job submission; raises ValueError for invalid ones."""
+    unknown = set(fields) - set(JOB_DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown job settings: {', '.join(sorted(unknown))}")
+    spec = dict(JOB_DEFAULTS, **fields)
+    if not spec['models'] or not isinstance(spec['models'], list):
+        raise ValueError("'models' must be a non-empty list of model names")
+    if spec['evaluations'] is None:
+        spec['evaluations'] = task_names()
+    missing = [name for name in spec['evaluations'] if find_task(name) is None]
+    if missing:
+        raise ValueError(f"unknown evaluations: {', '.join(missing)}")
+    if spec['scoring'] not in SCORING_MODES:
+        raise ValueError(f"'scoring' must be one of {', '.join(SCORING_MODES)}")
+    if spec['order'] not in ORDER_POLICIES:
+        raise ValueError(f"'order' must be one of {', '.join(ORDER_POLICIES)}")
+    return spec
+
+class Job:
+    """A submitted evaluation: its settings, status, results and the events streamed to clients."""
+
+    def __init__(self, job_id, spec):
+        self.id = job_id
+        self.spec = spec
+        self.status = 'queued'
+        self.submitted = time.time()
+        self.results = {}
+        self.error = None
+        self.events = []
+        self._cond = threading.Condition()
+
+    def emit(self, event, status=None, **fields):
+        with self._cond:
+            if status is not None:
+                self.status = status
+            self.events.append(dict(fields, event=event, job=self.id, status=self.status, time=time.time()))
+            self._cond.notify_all()
+
+    def record(self, model_name, eval_name, result):
+        with self._cond:
+            self.results.setdefault(model_name, {})[eval_name] = result
+
+    def follow(self):
+        """Yield every event of the job, from the first one, until it has finished."""
+        position = 0
+        while True:
+            with self._cond:
+                while position == len(self.events) and self.status not in FINISHED:
+                    self._cond.wait()
+                events = self.events[position:]
+                position = len(self.events)
+                finished = self.status in FINISHED
+            yield from events
+            if finished:
+                return
+
+    def summary(self):
+        # A copy, as the job thread may be adding results while it is serialized
+        with self._cond:
+            return {
+                'id': self.id,
+                'status': self.status,
+                'submitted': self.submitted,
+                'spec': self.spec,
+                'results': {model_name: dict(results) for model_name, results in self.results.items()},
+                'error': self.error,
+            }
+
+class EvaluationService:
+    """
+    State of a long-running evaluation server.
+
+    Jobs wait in a priority queue (highest `priority` first, then in order of
+    submission) and at most `max_jobs` run at once. Task data is loaded once
+    per task and sample settings and kept for later jobs, and so is each
+    model's ModelWrapper with its connections. Jobs on the same model share
+    its request slots through lanes (see `ModelWrapper.lane`) with the job's
+    priority. With a wrapper built with `deduplicate=True`, identical prompts
+    in flight for several jobs are sent once.
+
+    Every job records its results like a CLI run, in run files named
+    `<job id>-<model>` under `runs_dir`. Only the last `keep_finished`
+    finished jobs are kept in memory.
+
+    Args:
+        make_model: Function mapping a model name to a new ModelWrapper.
+        store: Optional PromptStore tasks are read from.
+        runs_dir: Directory of run files.
+        max_jobs: Jobs running at once.
+        warm_up: Load each model before a job uses it.
+        keep_finished: Finished jobs kept for GET /jobs.
+    """
+
+    def __init__(self, make_model, store=None, runs_dir='results/runs', max_jobs=2, warm_up=True, keep_finished=KEEP_FINISHED_JOBS):
+        self.make_model = make_model
+        self.store = store
+        self.runs_dir = runs_dir
+        self.max_jobs = max(1, int(max_jobs))
+        self.warm_up = warm_up
+        self.keep_finished = keep_finished
+        self.jobs = {}
+        self._queue = []
+        self._sequence = itertools.count(1)
+        self._running = 0
+        self._models = {}
+        self._task_data = {}
+        self._lock = threading.Lock()
+        # Held while creating a model or loading task data, so concurrent jobs do it once
+        self._load_lock = threading.Lock()
+
+    def submit(self, fields):
+        """Queue a job from its submitted settings (see JOB_DEFAULTS) and return it."""
+        spec = job_spec(fields)
+        with self._lock:
+            number = next(self._sequence)
+            job = Job(f"{RunLog.new_run_id()}-job{number}", spec)
+            self.jobs[job.id] = job
+            heapq.heappush(self._queue, (-spec['priority'], number, job))
+        job.emit('queued')
+        self._start_jobs()
+        return job
+
+    def job(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def job_list(self):
+        with self._lock:
+            return list(self.jobs.values())
+
+    def _forget_finished(self):
+        # Jobs are kept in order of submission, so the oldest finished go first
+        with self._lock:
+            finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED]
+            for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self.jobs[job_id]
+
+    def _start_jobs(self):
+        with self._lock:
+            while self._queue and self._running < self.max_jobs:
+                _, _, job = heapq.heappop(self._queue)
+                self._running += 1
+                threading.Thread(target=self._run_job, args=(job,), name=f"job-{job.id}", daemon=True).start()
+
+    def _model(self, model_name):
+        with self._load_lock:
+            if model_name not in self._models:
+                self._models[model_name] = self.make_model(model_name)
+            return self._models[model_name]
+
+    def _data(self, task, spec):
+        key = (task.name, spec['sample_size'], spec['seed'], spec['num_fewshot'], spec['fewshot_seed'])
+        with self._load_lock:
+            if key not in self._task_data:
+                self._task_data[key] = TaskData(task, sample_size=spec['sample_size'], store=self.store, seed=spec['seed'],
+                                                num_fewshot=spec['num_fewshot'], fewshot_seed=spec['fewshot_seed'])
+            return self._task_data[key]
+
+    def _run_job(self, job):
+        spec = job.spec
+        job.emit('started', status='running')
+        try:
+            for model_name in spec['models']:
+                model = self._model(model_name)
+                if self.warm_up:
+                    # As in the CLI, a failed warm-up only means the first requests load the model
+                    try:
+                        seconds, load_seconds = model.warm_up()
+                    except Exception as e:
+                        job.emit('warning', model=model_name, message=f"warm-up of {model_name} failed: {e}")
+                    else:
+                        job.emit('warm_up', model=model_name, seconds=seconds, load_seconds=load_seconds)
+                run = RunLog(RunLog.model_run_id(job.id, model_name), runs_dir=self.runs_dir,
+                             metadata={'model': model_name, 'sample_size': spec['sample_size'], 'seed': spec['seed'], 'scoring': spec['scoring'],
+                                       'group_prompts': spec['group_prompts'], 'num_fewshot': spec['num_fewshot'], 'fewshot_seed': spec['fewshot_seed'],
+                                       'job': job.id, 'concurrency': model.concurrency})
+                results = {}
+                for eval_name in spec['evaluations']:
+                    results[eval_name] = self._run_task(job, model, model_name, eval_name, run)
+                    job.record(model_name, eval_name, results[eval_name])
+                run.write_report(results)
+                run.close()
+                job.emit('model_done', model=model_name, report=run.report_path)
+        except Exception as e:
+            job.error = repr(e)
+            job.emit('failed', status='failed', error=job.error)
+        else:
+            job.emit('done', status='done', results=job.summary()['results'])
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._forget_finished()
+            self._start_jobs()
+
+    def _run_task(self, job, model, model_name, eval_name, run):
+        spec = job.spec
+        task = find_task(eval_name)
+        data = self._data(task, spec)
+        job.emit('task_started', model=model_name, task=eval_name)
+        last = 0.0
+
+        def progress(scored, count):
+            nonlocal last
+            now = time.monotonic()
+            if scored == count or now - last >= PROGRESS_INTERVAL:
+                last = now
+                job.emit('progress', model=model_name, task=eval_name, scored=scored, count=count)
+
+        with model.lane(f"{job.id}/{eval_name}", spec['priority']) as lane:
+            result = run_task(lane, task, run=run, scoring=spec['scoring'], group_prompts=spec['group_prompts'], data=data,
+                              ci_width=spec['ci_width'], time_budget=spec['time_budget'], confidence=spec['confidence'],
+                              stream=spec['stream'], order=spec['order'], progress=progress)
+        job.emit('task_done', model=model_name, task=eval_name, result=result)
+        return result
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API of the evaluation service.
+
+    GET /tasks                 available task names
+    GET /jobs                  summaries of all jobs
+    POST /jobs                 submit a job (JSON object of JOB_DEFAULTS settings)
+    GET /jobs/<id>             summary of one job
+    GET /jobs/<id>/events      the job's events as NDJSON, streamed until it finishes
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        service = self.server.service
+        parts = [part for part in self.path.split('/') if part]
+        job = service.job(parts[1]) if len(parts) in (2, 3) and parts[0] == 'jobs' else None
+        if parts == ['tasks']:
+            self._send_json(200, {'tasks': task_names()})
+        elif parts == ['jobs']:
+            self._send_json(200, {'jobs': [job.summary() for job in service.job_list()]})
+        elif job is not None:
+            if len(parts) == 2:
+                self._send_json(200, job.summary())
+            elif parts[2] == 'events':
+                self._stream(job)
+            else:
+                self._send_json(404, {'error': 'not found'})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if self.path.rstrip('/') != '/jobs':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            fields = json.loads(self.rfile.read(length) or b'{}')
+            job = self.server.service.submit(fields)
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(201, job.summary())
+
+    def _stream(self, job):
+        # No Content-Length: the body ends when the connection closes
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for event in job.follow():
+                self.wfile.write(json.dumps(event).encode('utf-8') + b'\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; the job keeps running
+            pass
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super().__init__(address, ServiceHandler)
+        self.service = service
+
+class UnixServiceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service):
+        if os.path.exists(path):
+            # Left behind by a service that did not shut down cleanly
+            os.unlink(path)
+        super().__init__(path, ServiceHandler)
+        self.service = service
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ('unix', 0)
+
+def parse_address(address):
+    """`('unix', path)` for 'unix:PATH', else `('tcp', (host, port))` for '[http://]HOST:PORT'."""
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    parsed = urllib.parse.urlsplit(address if '://' in address else f"http://{address}")
+    return 'tcp', (parsed.hostname or '127.0.0.1', parsed.port or 80)
+
+def create_server(address, service):
+    """An HTTP server for `service` listening on `address` (see `parse_address`)."""
+    kind, target = parse_address(address)
+    if kind == 'unix':
+        return UnixServiceServer(target, service)
+    return ServiceServer(target, service)
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+class ServiceClient:
+    """
+    Client of a running evaluation service.
+
+    Args:
+        address: 'HOST:PORT' or 'http://HOST:PORT' for TCP, 'unix:PATH' for a Unix socket.
+    """
+
+    def __init__(self, address):
+        self.kind, self.target = parse_address(address)
+
+    def _connection(self):
+        if self.kind == 'unix':
+            return _UnixConnection(self.target)
+        host, port = self.target
+        return http.client.HTTPConnection(host, port)
+
+    def _request(self, method, path, body=None):
+        connection = self._connection()
+        try:
+            data = None if body is None else json.dumps(body).encode('utf-8')
+            connection.request(method, path, body=data, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            payload = json.loads(response.read() or b'{}')
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise ValueError(payload.get('error', f"HTTP {response.status}"))
+        return payload
+
+    def submit(self, fields):
+        """Submit a job; returns its summary, with its 'id'."""
+        return self._request('POST', '/jobs', fields)
+
+    def job(self, job_id):
+        return self._request('GET', f"/jobs/{job_id}")
+
+    def jobs(self):
+        return self._request('GET', '/jobs')['jobs']
+
+    def events(self, job_id):
+        """Yield the events of a job as they happen, until it finishes."""
+        connection = self._connection()
+        try:
+            connection.request('GET', f"/jobs/{job_id}/events")
+            response = connection.getresponse()
+            if response.status >= 400:
+                raise ValueError(json.loads(response.read() or b'{}').get('error', f"HTTP {response.status}"))
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            connection.close()
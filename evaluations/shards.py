@@ -0,0 +1,75 @@
+# evaluations/shards.py
+
+import os
+
+from evaluations.metrics import summarize_requests, wilson_interval
+from evaluations.run_log import RunLog
+
+def parse_shard(value):
+    """Parse an `i/N` shard spec (0 <= i < N) into an `(i, N)` pair."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard {value!r}; expected INDEX/COUNT, e.g. 0/4") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {value!r}; INDEX must be between 0 and COUNT-1")
+    return index, count
+
+def shard_run_id(model_run_id, shard):
+    """ID of the run file holding one shard of a model's run."""
+    index, count = shard
+    return f"{model_run_id}-shard{index}of{count}"
+
+def task_result(task_name, records, confidence=0.95):
+    """
+    Rebuild a task's result from its stored example records.
+
+    Returns a dict shaped like the one returned by `run_task`.
+    """
+    correct = sum(record['correct'] for record in records)
+    total = len(records)
+    ci_low, ci_high = wilson_interval(correct, total, confidence)
+    return {
+        'task': task_name,
+        'accuracy': correct / total * 100 if total > 0 else 0,
+        'ci_low': ci_low,
+        'ci_high': ci_high,
+        'confidence': confidence,
+        'correct': correct,
+        'total': total,
+        'errors': sum(1 for record in records if record.get('error') is not None),
+        'stopped_early': False,
+        'metrics': summarize_requests((record.get('latency'), record.get('stats')) for record in records),
+    }
+
+def merge_shards(run_id, model_name, count, task_names, runs_dir='results/runs', confidence=0.95):
+    """
+    Merge the `count` shard files of `model_name` in run `run_id`.
+
+    Every example record is copied into the model's regular run file
+    (`<run_id>-<model>.jsonl`), so the merged run can be resumed or re-scored
+    like an unsharded one, and its report is written from the union of all
+    shards. Returns `(run, results)`, the merged RunLog (closed) and the
+    per-task results.
+    """
+    model_run_id = RunLog.model_run_id(run_id, model_name)
+    shards = []
+    for index in range(count):
+        shard_id = shard_run_id(model_run_id, (index, count))
+        if RunLog.exists(shard_id, runs_dir):
+            shards.append(RunLog(shard_id, runs_dir=runs_dir))
+        else:
+            print(f"Warning: no run file for shard {index}/{count} of {model_name} ({os.path.join(runs_dir, shard_id)}.jsonl)")
+
+    metadata = dict(shards[0].metadata) if shards else {'model': model_name}
+    for key in ('type', 'run_id', 'started', 'shard'):
+        metadata.pop(key, None)
+    run = RunLog(model_run_id, runs_dir=runs_dir, metadata=dict(metadata, shards=count))
+    for shard in shards:
+        run.merge(shard)
+        shard.close()
+
+    results = {task_name: task_result(task_name, list(run.completed(task_name).values()), confidence) for task_name in task_names}
+    run.write_report(results)
+    run.close()
+    return run, results
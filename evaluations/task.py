@@ -0,0 +1,88 @@
+# evaluations/task.py
+
+class Task:
+    """
+    Description of one benchmark, consumed by `evaluations.runner.run_task`.
+
+    A task only says what to evaluate; loading, scheduling, error handling,
+    run recording and scoring are shared by every task in the runner.
+
+    Args:
+        name: Short name used on the command line and in run files (e.g. 'boolq').
+        display_name: Human readable name used in progress bars and reports.
+        dataset: Positional arguments for `datasets.load_dataset`, e.g. ("super_glue", "boolq").
+        build_prompt: Function mapping a dataset example to the prompt string.
+        extract: Function mapping (response, example) to a prediction, or None if unparseable.
+        label: Function mapping a dataset example to the gold prediction.
+        split: Dataset split to evaluate on.
+        answer: Optional function mapping a dataset example to its gold answer
+            as the model should write it after 'Answer:' (e.g. 'Yes'). Tasks
+            that provide it support few-shot prompts (see `fewshot_prefix`).
+        train_split: Dataset split few-shot exemplars are drawn from.
+        warn_invalid: Print a warning for responses the extractor cannot parse.
+        choices: Optional function mapping an example to a dict from answer
+            token (e.g. 'A') to prediction. Tasks that provide it support
+            `choice` scoring, where the model only emits the answer token.
+        answer_values: Optional function mapping an example to a dict from
+            answer string (e.g. 'Yes') to prediction, for `structured` scoring,
+            where the reply is constrained to one of these strings. Defaults
+            to `choices`.
+        group_key: Optional function mapping an example to the long context it
+            shares with other examples (e.g. a passage). Examples with the same
+            key are sent back to back so the server can reuse its prompt cache.
+        build_group_prompt: Optional function mapping a list of examples with the
+            same `group_key` to one prompt that answers all of them.
+        split_group_response: Function mapping (response, count) for a group
+            prompt to one answer string per example, fed to `extract`.
+        answer_pattern: Optional compiled regex that matches once a streamed
+            reply contains a complete answer; generation is then cancelled.
+        max_tokens: Cap on generated tokens (`num_predict`) when streaming.
+        stop: Optional list of sequences that end a streamed reply once it
+            has some non-whitespace text, so a leading newline does not.
+    """
+
+    def __init__(self, name, display_name, dataset, build_prompt, extract, label,
+                 split='validation', answer=None, train_split='train', warn_invalid=False, choices=None, answer_values=None,
+                 group_key=None, build_group_prompt=None, split_group_response=None,
+                 answer_pattern=None, max_tokens=None, stop=None):
+        self.name = name
+        self.display_name = display_name
+        self.dataset = dataset
+        self.build_prompt = build_prompt
+        self.extract = extract
+        self.label = label
+        self.split = split
+        self.answer = answer
+        self.train_split = train_split
+        self.warn_invalid = warn_invalid
+        self.choices = choices
+        self.answer_values = answer_values or choices
+        self.group_key = group_key
+        self.build_group_prompt = build_group_prompt
+        self.split_group_response = split_group_response
+        self.answer_pattern = answer_pattern
+        self.max_tokens = max_tokens
+        self.stop = stop
+
+    def stream_options(self):
+        """Generation options applied to this task's streamed requests."""
+        options = {}
+        if self.max_tokens is not None:
+            options['num_predict'] = self.max_tokens
+        return options or None
+
+    def reply_complete(self, text):
+        """
+        True once a streamed reply holds a complete answer or, after its
+        leading whitespace, one of the `stop` sequences.
+
+        Checked here rather than sent as the server's `stop` option, which
+        would also end a reply that starts with a newline.
+        """
+        text = text.lstrip()
+        if self.answer_pattern is not None and self.answer_pattern.search(text):
+            return True
+        return any(stop in text for stop in self.stop or ())
+
+    def __repr__(self):
+        return f"Task({self.name!r})"
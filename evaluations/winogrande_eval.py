@@ -1,49 +1,22 @@
 # evaluations/winogrande_eval.py
 
-from datasets import load_dataset
-from tqdm import tqdm
 import re
 
-def evaluate_winogrande(model, sample_size=None):
+from evaluations.extractors import KeywordExtractor
+from evaluations.registry import register_task
+from evaluations.runner import run_task
+from evaluations.task import Task
+
+def evaluate_winogrande(model, sample_size=None, run=None):
     """
     Evaluate the model on the WinoGrande dataset.
 
     Args:
-        model: The model object with a `chat` method.
+        model: The model object with a `chat_many` method.
         sample_size: Number of samples to use for evaluation (default is entire dataset).
+        run: Optional RunLog to record per-example results in and resume from.
     """
-    winogrande_dataset = load_dataset("winogrande", "winogrande_xl", split="validation")
-
-    # If sample_size is provided, select a subset of the dataset
-    if sample_size:
-        winogrande_dataset = winogrande_dataset.select(range(min(sample_size, len(winogrande_dataset))))
-
-    correct = 0
-    total = 0
-
-    for idx, example in enumerate(tqdm(winogrande_dataset, desc="Evaluating WinoGrande")):
-        sentence = example['sentence']
-        option1 = example['option1']
-        option2 = example['option2']
-        correct_answer = example['answer']
-
-        prompt = create_winogrande_prompt(sentence, option1, option2)
-
-        try:
-            response = model.chat(prompt)
-            predicted_answer = extract_winogrande_answer(response)
-
-            if predicted_answer == correct_answer:
-                correct += 1
-            total += 1
-
-        except Exception as e:
-            print(f"Error processing example {idx}: {e}")
-            continue
-
-    accuracy = correct / total * 100 if total > 0 else 0
-    print(f"WinoGrande Accuracy: {accuracy:.2f}%")
-    return accuracy
+    return run_task(model, TASK, sample_size=sample_size, run=run)['accuracy']
 
 def create_winogrande_prompt(sentence, option1, option2):
     prompt = f"""
@@ -55,11 +28,22 @@ Please select the correct option (Option 1 or Option 2).
 Answer:""".strip()
     return prompt
 
+EXTRACTOR = KeywordExtractor([('1', ['option 1']), ('2', ['option 2'])])
+
 def extract_winogrande_answer(response):
-    response = response.strip().lower()
-    if 'option 1' in response:
-        return '1'
-    elif 'option 2' in response:
-        return '2'
-    else:
-        return None
+    return EXTRACTOR(response)
+
+TASK = register_task(Task(
+    name='winogrande',
+    display_name='WinoGrande',
+    dataset=("winogrande", "winogrande_xl"),
+    build_prompt=lambda example: create_winogrande_prompt(example['sentence'], example['option1'], example['option2']),
+    extract=EXTRACTOR,
+    label=lambda example: example['answer'],
+    answer=lambda example: f"Option {example['answer']}",
+    choices=lambda example: {'1': '1', '2': '2'},
+    answer_values=lambda example: {'Option 1': '1', 'Option 2': '2'},
+    answer_pattern=re.compile(r"\boption [12]\b(?=\W)", re.IGNORECASE),
+    max_tokens=12,
+    stop=['\n'],
+))
@@ -0,0 +1,168 @@
+# evaluations/work_queue.py
+
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+# Seconds a claimed item stays with its worker without a heartbeat; after
+# that another worker may take it back
+LEASE_SECONDS = 120
+
+# Seconds between heartbeats of a worker holding an item (see `WorkQueue.hold`)
+HEARTBEAT_SECONDS = 30
+
+class WorkQueue:
+    """
+    SQLite-backed queue of evaluation work items shared by worker processes.
+
+    The coordinator adds one item per (run, model, shard); workers on this or
+    other machines (with the queue file on a shared filesystem) claim pending
+    items one at a time and mark them done or failed. Each item carries the
+    `main.py` arguments that evaluate it.
+
+    A claimed item is leased to its worker, which renews the lease while it
+    works (see `hold`). If the worker dies, the lease runs out and the item
+    can be claimed again by another worker.
+
+    Args:
+        path: Location of the queue file.
+        lease: Seconds a claim lasts without being renewed.
+    """
+
+    def __init__(self, path, lease=LEASE_SECONDS):
+        self.path = path
+        self.lease = lease
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Workers wait on each other's write transactions instead of failing
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                run_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                argv TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                error TEXT,
+                updated REAL NOT NULL,
+                claimed_at REAL,
+                UNIQUE (run_id, name)
+            )
+        """)
+
+    @staticmethod
+    def worker_name():
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def add(self, run_id, name, argv):
+        """
+        Queue item `name` of run `run_id`. An item that already exists and
+        failed or is still pending (e.g. from an interrupted coordinator) is
+        queued again; a done or running one is left alone, so a live worker's
+        shard is not evaluated twice.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute(
+            "INSERT OR IGNORE INTO items (run_id, name, argv, updated) VALUES (?, ?, ?, ?)",
+            (run_id, name, json.dumps(argv), time.time()),
+        )
+        self._conn.execute(
+            "UPDATE items SET status = 'pending', argv = ?, error = NULL, updated = ? WHERE run_id = ? AND name = ? AND status NOT IN ('done', 'running')",
+            (json.dumps(argv), time.time(), run_id, name),
+        )
+        self._conn.execute("COMMIT")
+
+    def claim(self, run_id=None):
+        """
+        Take the oldest pending item (of `run_id`, if given), or a running one
+        whose lease ran out, and mark it running for this worker.
+
+        Returns `(id, argv)`, or None when nothing is pending.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            query = "SELECT id, argv FROM items WHERE (status = 'pending' OR (status = 'running' AND claimed_at < ?))"
+            params = (now - self.lease,)
+            if run_id is not None:
+                query += " AND run_id = ?"
+                params += (run_id,)
+            row = self._conn.execute(query + " ORDER BY id LIMIT 1", params).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE items SET status = 'running', worker = ?, updated = ?, claimed_at = ? WHERE id = ?",
+                    (self.worker_name(), now, now, row[0]),
+                )
+        finally:
+            self._conn.execute("COMMIT")
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def renew(self, item_id):
+        """Extend this worker's lease on a running item."""
+        now = time.time()
+        self._conn.execute(
+            "UPDATE items SET claimed_at = ?, updated = ? WHERE id = ? AND status = 'running' AND worker = ?",
+            (now, now, item_id, self.worker_name()),
+        )
+
+    @contextlib.contextmanager
+    def hold(self, item_id, interval=HEARTBEAT_SECONDS):
+        """Renew the lease on `item_id` every `interval` seconds while the block runs."""
+        done = threading.Event()
+
+        def heartbeat():
+            # SQLite connections belong to the thread that opened them
+            queue = WorkQueue(self.path, self.lease)
+            try:
+                while not done.wait(interval):
+                    queue.renew(item_id)
+            finally:
+                queue.close()
+
+        thread = threading.Thread(target=heartbeat, name=f"lease-{item_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+    def finish(self, item_id, error=None):
+        """Mark an item done or failed, unless its lease ran out and another worker took it."""
+        self._conn.execute(
+            "UPDATE items SET status = ?, error = ?, updated = ? WHERE id = ? AND worker = ?",
+            ('failed' if error else 'done', error, time.time(), item_id, self.worker_name()),
+        )
+
+    def requeue_expired(self, run_id):
+        """Put the running items of `run_id` whose lease ran out back to pending; returns how many."""
+        cursor = self._conn.execute(
+            "UPDATE items SET status = 'pending', worker = NULL, updated = ? WHERE run_id = ? AND status = 'running' AND claimed_at < ?",
+            (time.time(), run_id, time.time() - self.lease),
+        )
+        return cursor.rowcount
+
+    def names(self, run_id, status):
+        """Names of the items of `run_id` with `status`."""
+        rows = self._conn.execute("SELECT name FROM items WHERE run_id = ? AND status = ? ORDER BY id", (run_id, status))
+        return [row[0] for row in rows.fetchall()]
+
+    def counts(self, run_id):
+        """Number of items of `run_id` per status."""
+        rows = self._conn.execute("SELECT status, COUNT(*) FROM items WHERE run_id = ? GROUP BY status", (run_id,))
+        return dict(rows.fetchall())
+
+    def failures(self, run_id):
+        """`(name, worker, error)` of the failed items of `run_id`."""
+        rows = self._conn.execute("SELECT name, worker, error FROM items WHERE run_id = ? AND status = 'failed' ORDER BY id", (run_id,))
+        return rows.fetchall()
+
+    def close(self):
+        self._conn.close()
@@ -1,50 +1,610 @@
 # main.py
 
 import argparse
-from evaluations.boolq_eval import evaluate_boolq
-from evaluations.hellaswag_eval import evaluate_hellaswag
-from evaluations.winogrande_eval import evaluate_winogrande
-from evaluations.rte_eval import evaluate_rte
-from evaluations.piqa_eval import evaluate_piqa
-from evaluations.commonsenseqa_eval import evaluate_commonsenseqa
-from evaluations.multirc_eval import evaluate_multirc
-from evaluations.arc_eval import evaluate_arc
-from evaluations.cb_eval import evaluate_cb
-from models.model_loader import ModelWrapper
-
-def main():
-    # Set up argument parsing
+import copy
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from evaluations.metrics import format_comparison, format_metrics
+from evaluations.runner import CHARS_PER_TOKEN, FEWSHOT_SEED, ORDER_POLICIES, SCORING_MODES, TaskData, run_task
+from evaluations.prompt_store import PromptStore
+from evaluations.registry import find_task, task_names
+from evaluations.rescore import needs_task_data, rescore
+from evaluations.run_log import RunLog
+from evaluations.shards import merge_shards, parse_shard, shard_run_id, task_result
+from evaluations.work_queue import HEARTBEAT_SECONDS, WorkQueue
+from models.response_cache import CACHE_MODES, ResponseCache
+
+# Model clients (httpx, ollama), the service and the planner are imported where
+# they are used, so --help and --list-tasks start without them
+
+BACKENDS = ['ollama', 'hf']
+
+# Keep-alive sent with every request during a run, so the model is not unloaded between tasks
+RUN_KEEP_ALIVE = '30m'
+# Ollama's own default, restored once a model's evaluations are done
+DEFAULT_KEEP_ALIVE = '5m'
+
+def select_tasks(names):
+    """Map each of `names` (default: every available task) to its Task, skipping unknown names with a message."""
+    tasks = {}
+    for name in task_names() if names is None else names:
+        task = find_task(name)
+        if task is None:
+            print(f"Evaluation {name} not found.")
+        else:
+            tasks[name] = task
+    return tasks
+
+class ListTasks(argparse.Action):
+    """`--list-tasks`: print the available tasks and exit, like `--help`."""
+
+    def __init__(self, option_strings, dest, **kwargs):
+        super().__init__(option_strings, dest, nargs=0, default=argparse.SUPPRESS, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        for name in task_names():
+            task = find_task(name)
+            print(f"{name:<15} {task.display_name:<15} {'/'.join(task.dataset)} ({task.split})")
+        parser.exit()
+
+def prepare(argv):
+    parser = argparse.ArgumentParser(prog='main.py prepare', description="Download each task's validation split and store it with pre-rendered prompts for offline runs")
+    parser.add_argument('--evaluations', nargs='+', default=None, help='List of evaluations to prepare (default: all)')
+    parser.add_argument('--sample-size', type=int, default=None, help='Number of samples to store from each dataset (default: entire split)')
+    parser.add_argument('--store', type=str, default='data/store', help='Directory of the prompt store')
+    parser.add_argument('--train', action='store_true', help='Also store the train splits, so --num-fewshot runs work offline')
+    args = parser.parse_args(argv)
+
+    store = PromptStore(args.store)
+    for eval_name, task in select_tasks(args.evaluations).items():
+        rows = store.prepare(task, sample_size=args.sample_size, train=args.train)
+        print(f"Prepared {eval_name}: {rows} examples")
+
+def rescore_run(argv):
+    parser = argparse.ArgumentParser(prog='main.py rescore', description="Parse the stored responses of a run again with the current extractors and report the new accuracy")
+    parser.add_argument('run_file', help="ID of the run file to re-score, e.g. '<run-id>-<model>' for results/runs/<run-id>-<model>.jsonl")
+    parser.add_argument('--evaluations', nargs='+', default=None, help='Tasks to re-score (default: every task in the run)')
+    parser.add_argument('--runs-dir', type=str, default='results/runs', help='Directory holding run files')
+    parser.add_argument('--store', type=str, default='data/store', help='Prompt store, for runs whose records lack gold labels')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the reported accuracy interval (default: 0.95)')
+    args = parser.parse_args(argv)
+    if not RunLog.exists(args.run_file, args.runs_dir):
+        parser.error(f"no run file {args.run_file} in {args.runs_dir}")
+
+    run = RunLog(args.run_file, runs_dir=args.runs_dir)
+    store = PromptStore(args.store) if os.path.exists(args.store) else None
+    scoring = run.metadata.get('scoring', 'generate')
+    results = {}
+    for task_name, task in select_tasks(args.evaluations or run.tasks()).items():
+        records = list(run.completed(task_name).values())
+        data = None
+        if needs_task_data(task, records, scoring):
+            data = TaskData(task, sample_size=run.metadata.get('sample_size'), store=store, seed=run.metadata.get('seed'))
+        old = task_result(task_name, records, args.confidence)
+        old_predictions = [record['prediction'] for record in records]
+        start = time.perf_counter()
+        rescore(task, records, data=data, scoring=scoring)
+        elapsed = time.perf_counter() - start
+        results[task_name] = task_result(task_name, records, args.confidence)
+        changed = sum(old_prediction != record['prediction'] for old_prediction, record in zip(old_predictions, records))
+        print(f"{task_name}: {old['accuracy']:.2f}% -> {results[task_name]['accuracy']:.2f}% "
+              f"({changed}/{len(records)} predictions changed, re-scored in {elapsed:.2f}s)")
+    run.close()
+
+    report_path = os.path.join(args.runs_dir, f"{args.run_file}.rescored.report.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(run.metadata, type='report', rescored=time.time(), tasks=results), f, indent=2)
+    print(f"Report written to {report_path}")
+
+def compare_orders(model, tasks, load_data, args):
+    """Evaluate every task once per dispatch order, without the response cache or a run file, and compare their makespans."""
+    uncached = copy.copy(model)
+    uncached.cache = None
+    if not args.no_warm_up:
+        model.warm_up()
+    rows = []
+    for eval_name, task in tasks.items():
+        for order in ORDER_POLICIES:
+            print(f"Evaluating {eval_name} in {order} order")
+            result = run_task(uncached, task, scoring=args.scoring, group_prompts=args.group_prompts, data=load_data(eval_name),
+                              confidence=args.confidence, stream=args.stream, shard=args.shard, order=order)
+            rows.append((eval_name, order, result))
+
+    lines = ['| Task | Order | Makespan (s) | p95 latency (s) | Accuracy |', '|---|---|---|---|---|']
+    for eval_name, order, result in rows:
+        p95 = result['metrics']['latency_p95']
+        lines.append(f"| {eval_name} | {order} | {result['elapsed_seconds']:.2f} | {'n/a' if p95 is None else f'{p95:.3f}'} | {result['accuracy']:.2f}% |")
+    print('\n'.join(lines))
+
+def plan_run(args, tasks, load_data):
+    """Print the estimated tokens and wall time of every task for each model, without calling a model."""
+    from evaluations.planner import Throughput, count_tokens, format_plan, generation_per_request, load_history, load_tokenizer, plan_task, request_prompts
+
+    tokenizer_name = args.tokenizer or (args.model[0] if args.backend == 'hf' and len(args.model) == 1 else None)
+    tokenizer = load_tokenizer(tokenizer_name) if tokenizer_name else None
+    concurrency = max(args.concurrency, args.batch_size) if args.backend == 'hf' else args.concurrency
+    history = load_history(args.runs_dir)
+    counted = {}
+    for eval_name, task in tasks.items():
+        prompts, max_tokens = request_prompts(task, load_data(eval_name), scoring=args.scoring, group_prompts=args.group_prompts, shard=args.shard)
+        if max_tokens is None and args.stream:
+            max_tokens = task.max_tokens
+        counted[eval_name] = (prompts, count_tokens(prompts, tokenizer), max_tokens)
+
+    for model_name in args.model:
+        own = [entry for entry in history if entry[0].get('model') == model_name]
+        throughput = Throughput(own)
+        plans, sources = [], {}
+        for eval_name, (prompts, prompt_tokens, max_tokens) in counted.items():
+            generation, sources[eval_name] = generation_per_request(history, eval_name, args.scoring, model_name, max_tokens)
+            plans.append(plan_task(tasks[eval_name], prompts, prompt_tokens, generation, throughput, concurrency))
+
+        print(f"=== Plan: {model_name} at concurrency {concurrency} ===")
+        print(format_plan(plans, sources))
+        print(f"Prompt tokens counted with {f'the {tokenizer_name} tokenizer' if tokenizer else f'an estimate of {CHARS_PER_TOKEN} characters per token (pass --tokenizer to count exactly)'}.")
+        if throughput.prompt_rate:
+            print(f"Throughput from {throughput.runs} task results in {args.runs_dir}: prompt {throughput.prompt_rate:.1f} tok/s, "
+                  f"generation {throughput.generation_rate:.1f} tok/s per request, {throughput.efficiency:.0%} concurrency efficiency.")
+        else:
+            print(f"No previous runs of {model_name} in {args.runs_dir}; run a small --sample-size first to estimate wall time.")
+        print()
+
+def open_run(args, run_id, model_name, concurrency):
+    """Open the run file of `model_name` within run `run_id`, resuming it when it exists."""
+    model_run_id = RunLog.model_run_id(run_id, model_name)
+    if args.shard:
+        model_run_id = shard_run_id(model_run_id, args.shard)
+
+    if (args.resume or args.run_id) and RunLog.exists(model_run_id, args.runs_dir):
+        run = RunLog(model_run_id, runs_dir=args.runs_dir)
+        if run.metadata.get('model') != model_name:
+            print(f"Warning: run {model_run_id} was recorded with model {run.metadata.get('model')}, not {model_name}")
+        if run.metadata.get('scoring', 'generate') != args.scoring:
+            print(f"Warning: run {model_run_id} was recorded with {run.metadata.get('scoring', 'generate')} scoring, not {args.scoring}")
+        if run.metadata.get('num_fewshot', 0) != args.num_fewshot:
+            print(f"Warning: run {model_run_id} was recorded with {run.metadata.get('num_fewshot', 0)} few-shot examples, not {args.num_fewshot}")
+        if run.metadata.get('seed') != args.seed:
+            # Indices refer to positions in the (possibly shuffled) split
+            print(f"Warning: run {model_run_id} was recorded with seed {run.metadata.get('seed')}; using it to keep example indices consistent")
+            args.seed = run.metadata.get('seed')
+        print(f"Resuming run: {run.run_id}")
+    else:
+        run = RunLog(model_run_id, runs_dir=args.runs_dir,
+                     metadata={'model': model_name, 'sample_size': args.sample_size, 'seed': args.seed, 'scoring': args.scoring, 'group_prompts': args.group_prompts,
+                               'num_fewshot': args.num_fewshot, 'fewshot_seed': args.fewshot_seed, 'shard': args.shard, 'concurrency': concurrency})
+    return run
+
+def server_resources(args):
+    """The response cache, host pool and transport settings of a run, from its server arguments."""
+    from models.host_pool import read_hosts_file
+
+    cache = None
+    if args.cache != 'off':
+        cache = ResponseCache(args.cache_path, mode=args.cache, max_size_mb=args.cache_max_size)
+    hosts = list(args.hosts or [])
+    if args.hosts_file:
+        hosts += read_hosts_file(args.hosts_file)
+    # Timeouts and retries of every request to the model server
+    transport = {'timeout': args.timeout, 'connect_timeout': args.connect_timeout, 'retries': args.retries, 'retry_backoff': args.retry_backoff}
+    return cache, hosts, transport
+
+def make_model(args, model_name, cache, hosts, transport, deduplicate=False):
+    """Load `model_name` with the backend, concurrency and keep-alive chosen in `args`."""
+    from models.model_loader import ModelWrapper
+
+    backend = None
+    concurrency = args.concurrency
+    if args.backend == 'hf':
+        from models.hf_backend import HFBackend
+
+        backend = HFBackend(model_name, device=args.device, batch_size=args.batch_size)
+        # Enough requests in flight to fill every batch
+        concurrency = max(concurrency, args.batch_size)
+    return ModelWrapper(model_name, custom_client_host=args.custom_client_host, concurrency=concurrency, cache=cache, keep_alive=args.keep_alive or RUN_KEEP_ALIVE,
+                        hosts=hosts, max_per_host=args.max_per_host, backend=backend, deduplicate=deduplicate, **transport)
+
+def add_server_arguments(parser):
+    """Arguments of the model server connection, response cache and storage, shared by runs and 'main.py serve'."""
+    parser.add_argument('--backend', choices=BACKENDS, default='ollama', help="'ollama' (default) sends requests to an Ollama server; 'hf' runs Hugging Face models in-process with batched generation")
+    parser.add_argument('--batch-size', type=int, default=8, help='Prompts per forward pass with --backend hf')
+    parser.add_argument('--device', type=str, default='cpu', help="Torch device for --backend hf, e.g. 'cpu' or 'cuda'")
+    parser.add_argument('--custom-client-host', type=str, default=None, help='Host for custom client (if not specified, uses standard module)')
+    parser.add_argument('--hosts', nargs='+', default=None, help='Several Ollama hosts to spread requests over (least outstanding requests first, with failover)')
+    parser.add_argument('--hosts-file', type=str, default=None, help="File listing Ollama hosts, one 'URL [MAX_CONCURRENCY]' per line")
+    parser.add_argument('--max-per-host', type=int, default=None, help='Maximum requests in flight per host when using --hosts or --hosts-file')
+    parser.add_argument('--concurrency', type=int, default=1, help='Maximum number of requests in flight to the model server (default: 1)')
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds to wait for a reply before the request is retried (default: 600)')
+    parser.add_argument('--connect-timeout', type=float, default=10, help='Seconds to wait for a connection to the model server (default: 10)')
+    parser.add_argument('--retries', type=int, default=3, help='Times a request is retried after a timeout, dropped connection or 429/5xx reply, with jittered exponential backoff (default: 3)')
+    parser.add_argument('--retry-backoff', type=float, default=1.0, help='Base delay in seconds between retries, doubled after every attempt (default: 1.0)')
+    parser.add_argument('--cache', choices=CACHE_MODES, default='readwrite', help="Response cache mode: 'readwrite' (default), 'readonly', 'refresh' (ignore and overwrite hits) or 'off'")
+    parser.add_argument('--cache-path', type=str, default='cache/responses.sqlite', help='Path of the on-disk response cache')
+    parser.add_argument('--cache-max-size', type=float, default=1024, help='Maximum cache size in MB before least recently used responses are evicted')
+    parser.add_argument('--keep-alive', type=str, default=None, help=f"How long Ollama keeps the model loaded after each request, e.g. '30m' (default: {RUN_KEEP_ALIVE} during the run, then the server default)")
+    parser.add_argument('--no-warm-up', action='store_true', help='Do not load the model before each task; its load time then counts towards the first requests')
+    parser.add_argument('--store', type=str, default='data/store', help="Prompt store written by 'main.py prepare'; prepared tasks are read from it offline")
+    parser.add_argument('--runs-dir', type=str, default='results/runs', help='Directory where per-example run files are written')
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Model Evaluation Suite")
-    parser.add_argument('--model', type=str, required=True, help='Model name to evaluate')
-    parser.add_argument('--evaluations', nargs='+', default=['boolq', 'hellaswag', 'winogrande', 'rte', 'piqa', 'commonsenseqa', 'multirc', 'arc', 'cb'], help='List of evaluations to run')
+    parser.add_argument('--model', nargs='+', required=True, help='Model name(s) to evaluate; several models are compared on the same prompts')
+    parser.add_argument('--evaluations', nargs='+', default=None, help='List of evaluations to run (default: all, see --list-tasks)')
+    parser.add_argument('--list-tasks', action=ListTasks, help='List the available evaluations and exit')
     parser.add_argument('--sample-size', type=int, default=None, help='Number of samples to evaluate from each dataset')
-    parser.add_argument('--custom-client-host', type=str, default=None, help='Host for custom client (if not specified, uses standard module)')
-    args = parser.parse_args()
-
-    # Load the model
-    model = ModelWrapper(args.model, custom_client_host=args.custom_client_host)
-
-    # Dictionary mapping evaluation names to functions
-    evaluation_functions = {
-        'boolq': evaluate_boolq,
-        'hellaswag': evaluate_hellaswag,
-        'winogrande': evaluate_winogrande,
-        'rte': evaluate_rte,
-        'piqa': evaluate_piqa,
-        'commonsenseqa': evaluate_commonsenseqa,
-        'multirc': evaluate_multirc,
-        'arc': evaluate_arc,
-        'cb': evaluate_cb,
-    }
-
-    # Run evaluations
-    for eval_name in args.evaluations:
-        if eval_name in evaluation_functions:
-            print(f"Starting evaluation: {eval_name}")
-            accuracy = evaluation_functions[eval_name](model, sample_size=args.sample_size)
-            print(f"{eval_name} Accuracy: {accuracy:.2f}%\n")
+    parser.add_argument('--seed', type=int, default=None, help='Draw examples from a seeded random permutation of each split instead of its first rows')
+    parser.add_argument('--ci-width', type=float, default=None, help='Stop a task once the confidence interval of its accuracy is at most this many percentage points wide (implies --seed 0 if not set)')
+    parser.add_argument('--time-budget', type=float, default=None, help='Stop a task after this many seconds')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the reported accuracy interval (default: 0.95)')
+    add_server_arguments(parser)
+    parser.add_argument('--num-fewshot', type=int, default=0, help='Solved train examples put in front of every prompt, the same ones for every example of a task (default: 0)')
+    parser.add_argument('--fewshot-seed', type=int, default=FEWSHOT_SEED, help=f'Seed of the few-shot exemplar draw (default: {FEWSHOT_SEED})')
+    parser.add_argument('--scoring', choices=SCORING_MODES, default='generate', help="'generate' parses free-text answers (default); 'choice' asks multiple-choice tasks for a single answer token; 'structured' constrains replies to a JSON answer field (Ollama only)")
+    parser.add_argument('--stream', action='store_true', help='Stream replies and stop generation as soon as an answer can be parsed (with per-task token caps)')
+    parser.add_argument('--group-prompts', action='store_true', help='Answer all MultiRC questions about a paragraph with a single request')
+    parser.add_argument('--interleave', action='store_true', help='Run all evaluations at once, sharing the --concurrency request slots fairly between them')
+    parser.add_argument('--priority', nargs='+', default=[], metavar='TASK=N', help='With --interleave, give free request slots to tasks with a higher priority first (default: 0)')
+    parser.add_argument('--order', choices=ORDER_POLICIES, default='dataset', help="Order requests are sent in: 'dataset' (default), 'longest-first' or 'binned' by estimated prompt length; accuracy is the same whatever the order")
+    parser.add_argument('--plan', action='store_true', help='Instead of a run, render every prompt, count its tokens and print estimated tokens and wall time per task from the throughput of previous runs in --runs-dir; no model is called')
+    parser.add_argument('--tokenizer', type=str, default=None, help='Hugging Face tokenizer (model ID or path) to count tokens with for --plan (default: the model with --backend hf, otherwise an estimate)')
+    parser.add_argument('--compare-order', action='store_true', help='Instead of a normal run, evaluate each task once per --order policy (uncached, not recorded) and compare their makespans')
+    parser.add_argument('--no-preflight', action='store_true', help='Do not check that every model is pulled on the server before starting')
+    parser.add_argument('--resume', type=str, default=None, metavar='RUN_ID', help='Resume an interrupted run, skipping examples already recorded in its run file')
+    parser.add_argument('--run-id', type=str, default=None, help='ID of the run (default: current time); an existing run with this ID is resumed')
+    parser.add_argument('--shard', type=shard_arg, default=None, metavar='I/N', help='Only evaluate shard I of N (0-based) of every task, in a run file of its own')
+    parser.add_argument('--service', type=str, default=None, metavar='ADDRESS', help="Submit the run as a job to an evaluation service started with 'main.py serve' (HOST:PORT or unix:PATH) and follow its progress")
+    parser.add_argument('--job-priority', type=int, default=0, help='With --service, run this job before queued jobs with a lower priority (default: 0)')
+    return parser
+
+def shard_arg(value):
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def coordinate(argv):
+    parser = argparse.ArgumentParser(prog='main.py coordinate', description='Split a run into shards, evaluate them with worker processes and merge the results',
+                                     epilog='All other arguments are evaluation options (as for main.py) passed on to every worker.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Local worker processes to start (0 to only use remote workers)')
+    parser.add_argument('--shards', type=int, default=None, help='Number of shards per model (default: number of workers)')
+    parser.add_argument('--queue', type=str, default='results/queue.sqlite', help='Work queue file; remote workers need it on a shared filesystem')
+    coordinator_args, eval_argv = parser.parse_known_args(argv)
+    args = build_parser().parse_args(eval_argv)
+    if args.shard or args.resume:
+        parser.error("use --run-id to name or continue a sharded run; --shard and --resume are set per worker")
+    shards = coordinator_args.shards or coordinator_args.workers
+    if shards < 1:
+        parser.error("--shards is required when no local workers are started")
+
+    run_id = args.run_id or RunLog.new_run_id()
+    print(f"Run ID: {run_id}")
+    queue = WorkQueue(coordinator_args.queue)
+    # One item per model and shard, model by model so workers don't make the server swap weights
+    for model_name in args.model:
+        for index in range(shards):
+            queue.add(run_id, f"{model_name} shard {index}/{shards}",
+                      eval_argv + ['--model', model_name, '--run-id', run_id, '--shard', f"{index}/{shards}"])
+
+    os.makedirs(args.runs_dir, exist_ok=True)
+    processes = []
+    for number in range(coordinator_args.workers):
+        log_path = os.path.join(args.runs_dir, f"{run_id}.worker{number}.log")
+        with open(log_path, 'a', encoding='utf-8') as log:
+            processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', '--queue', coordinator_args.queue, '--run-id', run_id],
+                                              stdout=log, stderr=subprocess.STDOUT))
+    if processes:
+        print(f"Started {len(processes)} workers; logs in {os.path.join(args.runs_dir, run_id)}.worker*.log")
+    else:
+        print(f"Waiting for remote workers: python main.py worker --queue {coordinator_args.queue}")
+
+    progress = None
+    while True:
+        counts = queue.counts(run_id)
+        if counts != progress:
+            progress = counts
+            print('Shards: ' + ', '.join(f"{count} {status}" for status, count in sorted(counts.items())))
+        if not counts.get('pending') and not counts.get('running'):
+            break
+        if processes and all(process.poll() is not None for process in processes):
+            # Nobody local is left to take back the shards of a worker that died
+            # mid-shard, so return them to pending once their lease runs out
+            queue.requeue_expired(run_id)
+            stuck = queue.names(run_id, 'pending')
+            if stuck:
+                print(f"All local workers exited with shards still pending: {', '.join(stuck)}")
+                break
+        time.sleep(1)
+    # Workers still alive are idle, waiting out a heartbeat for shards to take back
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+
+    failures = queue.failures(run_id)
+    for name, worker_name, error in failures:
+        print(f"Failed: {name} on {worker_name}: {error}")
+    unfinished = sum(count for status, count in queue.counts(run_id).items() if status != 'done')
+    queue.close()
+    if unfinished:
+        print(f"{unfinished} shards did not finish; re-run with --run-id {run_id} to retry them (finished examples are kept).")
+        sys.exit(1)
+
+    # Merge the shard files into one exact report per model
+    tasks = select_tasks(args.evaluations)
+    results = {}
+    for model_name in args.model:
+        if len(args.model) > 1:
+            print(f"=== Model: {model_name} ===")
+        run, results[model_name] = merge_shards(run_id, model_name, shards, list(tasks), runs_dir=args.runs_dir, confidence=args.confidence)
+        for task_name, result in results[model_name].items():
+            print(f"{task_name} Accuracy: {result['accuracy']:.2f}% ({result['confidence']:.0%} CI {result['ci_low']:.2f}-{result['ci_high']:.2f}, n={result['total']})")
+        print(f"Report written to {run.report_path}")
+
+    if len(args.model) > 1:
+        comparison = format_comparison(results)
+        print(comparison)
+        comparison_path = os.path.join(args.runs_dir, f"{run_id}.comparison.md")
+        with open(comparison_path, 'w', encoding='utf-8') as f:
+            f.write(comparison + '\n')
+        print(f"Comparison written to {comparison_path}")
+
+def worker(argv):
+    parser = argparse.ArgumentParser(prog='main.py worker', description='Evaluate shards from a work queue until none are left')
+    parser.add_argument('--queue', type=str, default='results/queue.sqlite', help='Work queue file written by main.py coordinate')
+    parser.add_argument('--run-id', type=str, default=None, help='Only take shards of this run')
+    args = parser.parse_args(argv)
+
+    queue = WorkQueue(args.queue)
+    while True:
+        item = queue.claim(args.run_id)
+        if item is None:
+            if args.run_id is not None and queue.counts(args.run_id).get('running'):
+                # Stay around to take back shards of workers that die before finishing
+                time.sleep(HEARTBEAT_SECONDS)
+                continue
+            break
+        item_id, item_argv = item
+        print(f"Worker {WorkQueue.worker_name()}: main.py {' '.join(item_argv)}", flush=True)
+        try:
+            with queue.hold(item_id):
+                main(item_argv)
+            error = None
+        except (Exception, SystemExit) as e:
+            error = repr(e)
+            print(f"Shard failed: {error}", flush=True)
+        queue.finish(item_id, error)
+    queue.close()
+
+def serve(argv):
+    parser = argparse.ArgumentParser(prog='main.py serve', description='Run a long-lived evaluation service that keeps task data and model connections warm and runs jobs submitted with main.py --service')
+    parser.add_argument('--listen', type=str, default='127.0.0.1:8765', metavar='HOST:PORT', help='Address to accept jobs on (default: 127.0.0.1:8765)')
+    parser.add_argument('--socket', type=str, default=None, metavar='PATH', help='Accept jobs on this Unix socket instead of --listen')
+    parser.add_argument('--max-jobs', type=int, default=2, help='Jobs run at once, sharing each model\'s --concurrency request slots by job priority (default: 2)')
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+    from evaluations.service import EvaluationService, create_server
+
+    cache, hosts, transport = server_resources(args)
+    store = PromptStore(args.store) if os.path.exists(args.store) else None
+    service = EvaluationService(lambda model_name: make_model(args, model_name, cache, hosts, transport, deduplicate=True),
+                                store=store, runs_dir=args.runs_dir, max_jobs=args.max_jobs, warm_up=not args.no_warm_up)
+    address = f"unix:{args.socket}" if args.socket else args.listen
+    server = create_server(address, service)
+    print(f"Evaluation service listening on {address}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+def submit_job(args):
+    """Run the evaluation as a job of the service at `args.service`, printing its progress and results."""
+    unsupported = [flag for flag, value in (('--resume', args.resume), ('--run-id', args.run_id), ('--shard', args.shard), ('--interleave', args.interleave),
+                                            ('--compare-order', args.compare_order), ('--priority', args.priority)) if value]
+    if unsupported:
+        print(f"Error: {', '.join(unsupported)} cannot be used with --service")
+        sys.exit(1)
+    from evaluations.service import ServiceClient
+
+    client = ServiceClient(args.service)
+    try:
+        job = client.submit({
+            'models': args.model, 'evaluations': args.evaluations, 'sample_size': args.sample_size, 'seed': args.seed, 'scoring': args.scoring,
+            'group_prompts': args.group_prompts, 'stream': args.stream, 'num_fewshot': args.num_fewshot, 'fewshot_seed': args.fewshot_seed,
+            'order': args.order, 'ci_width': args.ci_width, 'time_budget': args.time_budget, 'confidence': args.confidence, 'priority': args.job_priority,
+        })
+    except (OSError, ValueError) as e:
+        print(f"Error: could not submit the job to {args.service}: {e}")
+        sys.exit(1)
+    print(f"Job ID: {job['id']}")
+
+    for event in client.events(job['id']):
+        kind = event['event']
+        if kind == 'started':
+            print("Job started")
+        elif kind == 'warm_up':
+            print(f"Warm-up of {event['model']}: {event['seconds']:.2f}s (model load {event['load_seconds']:.2f}s)")
+        elif kind == 'warning':
+            print(f"Warning: {event['message']}")
+        elif kind == 'task_started':
+            print(f"Starting evaluation: {event['task']} ({event['model']})")
+        elif kind == 'progress':
+            print(f"  {event['task']}: {event['scored']}/{event['count']}", flush=True)
+        elif kind == 'task_done':
+            result = event['result']
+            print(f"{event['task']} Accuracy: {result['accuracy']:.2f}% (evaluation {result['elapsed_seconds']:.1f}s, {format_metrics(result['metrics'])})\n")
+        elif kind == 'model_done':
+            print(f"Report written to {event['report']}")
+        elif kind == 'failed':
+            print(f"Job failed: {event['error']}")
+            sys.exit(1)
+        elif kind == 'done' and len(args.model) > 1:
+            print(format_comparison(event['results']))
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == 'prepare':
+        return prepare(argv[1:])
+    if argv and argv[0] == 'coordinate':
+        return coordinate(argv[1:])
+    if argv and argv[0] == 'worker':
+        return worker(argv[1:])
+    if argv and argv[0] == 'rescore':
+        return rescore_run(argv[1:])
+    if argv and argv[0] == 'serve':
+        return serve(argv[1:])
+
+    # Set up argument parsing
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.resume and not any(RunLog.exists(RunLog.model_run_id(args.resume, m), args.runs_dir) for m in args.model):
+        parser.error(f"no run file for run ID {args.resume} in {args.runs_dir}")
+    if args.shard and args.ci_width is not None:
+        parser.error("--ci-width cannot be combined with --shard: each shard would stop on its own interval")
+    if args.backend == 'hf' and args.scoring == 'structured':
+        parser.error("--scoring structured needs an Ollama server; the hf backend cannot constrain replies")
+
+    # Early stopping is only meaningful on a random sample, not a fixed prefix
+    if (args.ci_width is not None or args.time_budget is not None) and args.seed is None:
+        args.seed = 0
+
+    if args.service and not args.plan:
+        return submit_job(args)
+
+    # Open the response cache and collect the host pool, if several servers were given
+    cache, hosts, transport = server_resources(args)
+
+    # Open the prompt store, if one has been prepared
+    store = PromptStore(args.store) if os.path.exists(args.store) else None
+
+    priorities = {}
+    for value in args.priority:
+        eval_name, _, priority = value.partition('=')
+        try:
+            priorities[eval_name] = int(priority)
+        except ValueError:
+            parser.error(f"invalid --priority {value!r}; expected TASK=N")
+
+    run_id = args.resume or args.run_id or RunLog.new_run_id()
+    if not args.plan:
+        print(f"Run ID: {run_id}")
+
+    # Task modules are imported here, only for the selected tasks
+    tasks = select_tasks(args.evaluations)
+
+    # Datasets are loaded and prompts rendered once, then shared by every model
+    task_data = {}
+
+    def load_data(eval_name):
+        if eval_name not in task_data:
+            task_data[eval_name] = TaskData(tasks[eval_name], sample_size=args.sample_size, store=store, seed=args.seed,
+                                            num_fewshot=args.num_fewshot, fewshot_seed=args.fewshot_seed)
+        return task_data[eval_name]
+
+    if args.plan:
+        try:
+            return plan_run(args, tasks, load_data)
+        except ImportError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    results = {}
+
+    # Check every model is pulled before spending time on any of them
+    if args.backend == 'ollama' and not args.no_preflight:
+        from models.model_loader import ModelWrapper
+
+        for model_name in args.model:
+            try:
+                ModelWrapper(model_name, custom_client_host=args.custom_client_host, hosts=hosts, max_per_host=args.max_per_host, **transport).check_model()
+            except ValueError as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+
+    # Evaluate one model at a time, so the server never swaps weights between requests
+    for model_name in args.model:
+        if len(args.model) > 1:
+            print(f"=== Model: {model_name} ===")
+
+        # Load the model
+        model = make_model(args, model_name, cache, hosts, transport)
+        if hosts:
+            for url, healthy in model.client.check_health().items():
+                print(f"Host {url}: {'up' if healthy else 'DOWN'}")
+
+        if args.compare_order:
+            compare_orders(model, tasks, load_data, args)
+            continue
+
+        run = open_run(args, run_id, model_name, model.concurrency)
+
+        # Run evaluations
+        def warm_up():
+            # Load the model up front, so a cold load is reported on its own instead of stalling the first requests
+            if args.no_warm_up:
+                return None
+            try:
+                seconds, load_seconds = model.warm_up()
+            except Exception as e:
+                print(f"Warning: warm-up of {model_name} failed: {e}")
+                return None
+            print(f"Warm-up: {seconds:.2f}s (model load {load_seconds:.2f}s)")
+            return {'seconds': seconds, 'load_seconds': load_seconds}
+
+        def evaluate(eval_name, model):
+            return run_task(model, tasks[eval_name], run=run, scoring=args.scoring, group_prompts=args.group_prompts, data=load_data(eval_name),
+                            ci_width=args.ci_width, time_budget=args.time_budget, confidence=args.confidence, stream=args.stream, shard=args.shard,
+                            order=args.order)
+
+        def evaluate_in_lane(eval_name):
+            with model.lane(eval_name, priorities.get(eval_name, 0)) as lane:
+                return evaluate(eval_name, lane)
+
+        eval_names = list(tasks)
+        results[model_name] = {}
+        if args.interleave:
+            # Every task runs at once, sharing the request slots, so the server
+            # never idles between tasks; results are still reported per task
+            print(f"Starting evaluations: {', '.join(eval_names)}")
+            warm = warm_up()
+            with ThreadPoolExecutor(max_workers=max(1, len(eval_names))) as executor:
+                futures = {eval_name: executor.submit(evaluate_in_lane, eval_name) for eval_name in eval_names}
+            for eval_name, future in futures.items():
+                result = results[model_name][eval_name] = dict(future.result(), warm_up=warm)
+                print(f"{eval_name} Accuracy: {result['accuracy']:.2f}% (evaluation {result['elapsed_seconds']:.1f}s)")
+            print()
         else:
-            print(f"Evaluation {eval_name} not found.")
+            for eval_name in eval_names:
+                print(f"Starting evaluation: {eval_name}")
+                warm = warm_up()
+                result = results[model_name][eval_name] = dict(evaluate(eval_name, model), warm_up=warm)
+                print(f"{eval_name} Accuracy: {result['accuracy']:.2f}% (evaluation {result['elapsed_seconds']:.1f}s)\n")
+
+        if args.keep_alive is None and not args.no_warm_up:
+            # Hand the model back to the server's usual idle timeout
+            try:
+                model.warm_up(keep_alive=DEFAULT_KEEP_ALIVE)
+            except Exception:
+                pass
+
+        run.write_report(results[model_name])
+        print(f"Report written to {run.report_path}")
+        run.close()
+
+    # Compare models side by side
+    if len(args.model) > 1 and results:
+        comparison = format_comparison(results)
+        print(comparison)
+        comparison_path = os.path.join(args.runs_dir, f"{run_id}.comparison.md")
+        with open(comparison_path, 'w', encoding='utf-8') as f:
+            f.write(comparison + '\n')
+        print(f"Comparison written to {comparison_path}")
 
 if __name__ == '__main__':
     main()
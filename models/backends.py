@@ -0,0 +1,69 @@
+# models/backends.py
+
+import httpx
+import ollama
+
+# HTTP statuses worth retrying: rate limiting and server-side failures
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+
+def is_transient(error):
+    """True for errors a retry may fix (connection resets, timeouts, overload), not for bad requests."""
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code in TRANSIENT_STATUSES
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+def client_options(timeout=None, connect_timeout=10.0, max_connections=None):
+    """
+    Keyword arguments for `ollama.Client` that configure its pooled HTTP transport.
+
+    Connections are kept alive and reused across requests; the pool holds up
+    to `max_connections` of them (one per request in flight). `timeout` caps
+    each read (None: wait as long as generation takes) and `connect_timeout`
+    each connection attempt, in seconds.
+    """
+    options = {'timeout': httpx.Timeout(timeout, connect=connect_timeout)}
+    if max_connections:
+        options['limits'] = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return options
+
+class Backend:
+    """
+    Interface between ModelWrapper and a model server.
+
+    A backend speaks the subset of the Ollama client API the suite uses, so
+    the Ollama client, a pool of Ollama hosts, a mock server or an in-process
+    model can all be plugged into ModelWrapper.
+
+    `chat` takes the arguments of `ollama.Client.chat` (model, messages,
+    options, keep_alive, stream, format) and returns a response mapping in the
+    Ollama /api/chat format, or an iterator of chunks when `stream` is True.
+    `list` returns `{'models': [...]}` like `ollama.Client.list`.
+    """
+
+    def chat(self, model, messages, options=None, keep_alive=None, stream=False, format=''):
+        raise NotImplementedError
+
+    def list(self):
+        return {'models': []}
+
+    def warm_up(self, model, keep_alive=None):
+        """Load `model` without generating (an Ollama chat with no messages); returns the response."""
+        return self.chat(model=model, messages=[], keep_alive=keep_alive)
+
+class OllamaBackend(Backend):
+    """
+    Backend for a single Ollama server (default: OLLAMA_HOST or localhost).
+
+    `client_kwargs` are passed to `ollama.Client` (and on to `httpx.Client`),
+    e.g. the output of `client_options`.
+    """
+
+    def __init__(self, host=None, **client_kwargs):
+        self.client = ollama.Client(host=host, **client_kwargs)
+
+    def chat(self, model, messages, options=None, keep_alive=None, stream=False, format=''):
+        # `format` is 'json' or a JSON schema the reply is constrained to
+        return self.client.chat(model=model, messages=messages, options=options, keep_alive=keep_alive, stream=stream, format=format)
+
+    def list(self):
+        return self.client.list()
@@ -0,0 +1,213 @@
+# models/hf_backend.py
+
+import threading
+import time
+from concurrent.futures import Future
+
+from models.backends import Backend
+
+# Generated tokens when a request sets no `num_predict`
+DEFAULT_MAX_TOKENS = 256
+
+def split_duration(total_ns, counts):
+    """
+    Share `total_ns` out in proportion to `counts`, so the shares add up to
+    exactly `total_ns`. Equal shares when every count is zero.
+    """
+    if not counts:
+        return []
+    weights = counts if sum(counts) else [1] * len(counts)
+    total = sum(weights)
+    shares, done = [], 0
+    for weight in weights:
+        # Round the running total, not each share, so no nanosecond is lost
+        end = total_ns * (done + weight) // total
+        shares.append(end - total_ns * done // total)
+        done += weight
+    return shares
+
+class _Request:
+    def __init__(self, input_ids, options):
+        self.input_ids = input_ids
+        self.options = options
+        self.future = Future()
+        self.queued = time.perf_counter()
+
+    def batch_key(self):
+        # Only requests with the same generation settings can share a forward pass
+        options = self.options
+        return (options.get('num_predict'), options.get('temperature'), options.get('top_p'), options.get('top_k'), options.get('seed'))
+
+class HFBackend(Backend):
+    """
+    In-process Hugging Face `transformers` model with dynamic batching.
+
+    Requests from ModelWrapper's worker threads are tokenized as they arrive
+    and queued; a single generation thread gathers up to `batch_size` queued
+    requests with the same generation options and similar prompt lengths,
+    left-pads them and runs one batched `generate` call. Run ModelWrapper with
+    `concurrency` of at least `batch_size` to keep the batches full.
+
+    Supports the `num_predict`, `temperature`, `top_p`, `top_k`, `seed` and
+    `stop` options. Streaming requests receive the whole reply as one chunk.
+    Schema-constrained replies (`format`) are not supported.
+    Each reply's `eval_duration` is its share of the batch's generation time,
+    in proportion to the tokens it generated.
+
+    Args:
+        model_name: Hugging Face model ID or local path.
+        device: Torch device, e.g. 'cpu' or 'cuda'.
+        batch_size: Most requests per forward pass.
+        max_batch_tokens: Most tokens (longest prompt times batch size) per
+            forward pass, so a batch of long prompts does not run out of memory.
+        batch_wait: Seconds to wait for more requests before running a batch
+            that is not full.
+    """
+
+    def __init__(self, model_name, device='cpu', batch_size=8, max_batch_tokens=16384, batch_wait=0.01):
+        try:
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+        except ImportError:
+            raise ImportError("The hf backend needs transformers and torch: pip install transformers torch") from None
+
+        self.model_name = model_name
+        self.batch_size = max(1, int(batch_size))
+        self.max_batch_tokens = max_batch_tokens
+        self.batch_wait = batch_wait
+        self._torch = torch
+
+        start = time.perf_counter()
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # Decoder-only models generate after the last position, so pad on the left
+        self.tokenizer.padding_side = 'left'
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(model_name).to(device).eval()
+        self.device = device
+        # Reported once, by the warm-up or the first batch, whichever comes first
+        self._load_ns = int((time.perf_counter() - start) * 1e9)
+
+        self._pending = []
+        self._cond = threading.Condition()
+        threading.Thread(target=self._generate_loop, name='hf-batcher', daemon=True).start()
+
+    def _encode(self, messages):
+        if getattr(self.tokenizer, 'chat_template', None):
+            # The template already writes BOS and other special tokens
+            text = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+            return self.tokenizer(text, add_special_tokens=False)['input_ids']
+        return self.tokenizer('\n'.join(message['content'] for message in messages))['input_ids']
+
+    def chat(self, model, messages, options=None, keep_alive=None, stream=False, **kwargs):
+        if model != self.model_name:
+            raise ValueError(f"HFBackend serves {self.model_name}, not {model}")
+        if kwargs.get('format'):
+            raise ValueError("HFBackend does not support constrained (format) replies")
+        request = _Request(self._encode(messages), dict(options or {}))
+        with self._cond:
+            self._pending.append(request)
+            self._cond.notify()
+        response = request.future.result()
+        return self._chunks(response) if stream else response
+
+    @staticmethod
+    def _chunks(response):
+        yield response
+
+    def warm_up(self, model, keep_alive=None):
+        # The weights were loaded by the constructor
+        load_ns, self._load_ns = self._load_ns, 0
+        return {'load_duration': load_ns}
+
+    def list(self):
+        digest = getattr(self.model.config, '_commit_hash', None) or self.model_name
+        return {'models': [{'name': self.model_name, 'digest': digest}]}
+
+    def _take_batch(self):
+        # Oldest request first, so nothing waits forever, then those closest to its length
+        first = self._pending[0]
+        candidates = sorted(
+            (request for request in self._pending[1:] if request.batch_key() == first.batch_key()),
+            key=lambda request: abs(len(request.input_ids) - len(first.input_ids)),
+        )
+        batch = [first]
+        longest = len(first.input_ids)
+        for request in candidates:
+            if len(batch) >= self.batch_size:
+                break
+            length = max(longest, len(request.input_ids))
+            if length * (len(batch) + 1) > self.max_batch_tokens:
+                continue
+            batch.append(request)
+            longest = length
+        for request in batch:
+            self._pending.remove(request)
+        return batch
+
+    def _generate_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.perf_counter() + self.batch_wait
+                while len(self._pending) < self.batch_size and time.perf_counter() < deadline:
+                    self._cond.wait(deadline - time.perf_counter())
+                batch = self._take_batch()
+            load_ns, self._load_ns = self._load_ns, 0
+            try:
+                responses = self._generate(batch, load_ns)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, response in zip(batch, responses):
+                request.future.set_result(response)
+
+    def _generate(self, batch, load_ns):
+        torch = self._torch
+        options = batch[0].options
+        inputs = self.tokenizer.pad({'input_ids': [request.input_ids for request in batch]}, return_tensors='pt').to(self.device)
+        max_tokens = options.get('num_predict')
+        if max_tokens is None or max_tokens < 0:
+            max_tokens = DEFAULT_MAX_TOKENS
+        temperature = options.get('temperature', 0.8)
+        settings = {'max_new_tokens': max_tokens, 'pad_token_id': self.tokenizer.pad_token_id}
+        if temperature and temperature > 0:
+            settings.update(do_sample=True, temperature=temperature, top_p=options.get('top_p', 0.9), top_k=options.get('top_k', 40))
+        else:
+            settings['do_sample'] = False
+        if options.get('seed') is not None:
+            torch.manual_seed(options['seed'])
+
+        start = time.perf_counter()
+        with torch.no_grad():
+            output = self.model.generate(**inputs, **settings)
+        elapsed = time.perf_counter() - start
+
+        prompt_length = inputs['input_ids'].shape[1]
+        generated = []
+        for tokens in output[:, prompt_length:].tolist():
+            if self.tokenizer.eos_token_id in tokens:
+                tokens = tokens[:tokens.index(self.tokenizer.eos_token_id)]
+            generated.append(tokens)
+        durations = split_duration(int(elapsed * 1e9), [len(tokens) for tokens in generated])
+
+        responses = []
+        for i, (request, tokens) in enumerate(zip(batch, generated)):
+            content = self.tokenizer.decode(tokens, skip_special_tokens=True)
+            for stop in request.options.get('stop') or []:
+                if stop in content:
+                    content = content[:content.index(stop)]
+            responses.append({
+                'model': self.model_name,
+                'message': {'role': 'assistant', 'content': content},
+                'done': True,
+                'total_duration': int((time.perf_counter() - request.queued) * 1e9),
+                # Charge the model load to a single request
+                'load_duration': load_ns if i == 0 else 0,
+                'prompt_eval_count': len(request.input_ids),
+                'eval_count': len(tokens),
+                'eval_duration': durations[i],
+            })
+        return responses
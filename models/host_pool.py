@@ -0,0 +1,184 @@
+# models/host_pool.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import ollama
+
+from models.backends import Backend
+
+def is_host_failure(error):
+    """
+    True for errors that mean the server itself is unreachable or broken, not the request.
+
+    Read timeouts and dropped connections are not host failures: a healthy
+    host can be slow on a long generation, and marking it down would only
+    move its load onto the other hosts. ModelWrapper retries those requests.
+    """
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, ConnectionRefusedError))
+
+def read_hosts_file(path):
+    """
+    Parse a hosts file: one `URL [MAX_CONCURRENCY]` entry per line, '#' starts a comment.
+
+    Returns a list of `(url, limit)` pairs; `limit` is None when not given.
+    """
+    hosts = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            hosts.append((fields[0], int(fields[1]) if len(fields) > 1 else None))
+    return hosts
+
+class _Host:
+    def __init__(self, url, limit, client_kwargs):
+        self.url = url
+        self.limit = limit
+        self.client = ollama.Client(host=url, **client_kwargs)
+        self.outstanding = 0
+        self.healthy = True
+        self.down_until = 0.0
+
+class HostPool(Backend):
+    """
+    Spreads chat requests over several Ollama servers.
+
+    Each request goes to the healthy host with the fewest outstanding
+    requests that is below its own concurrency limit. When a host fails
+    with a connection or server error it is marked down for `retry_after`
+    seconds and the request is retried on another host, so a server dying
+    mid-run only costs a retry.
+
+    Args:
+        hosts: List of host URLs, or `(url, limit)` pairs with a per-host
+            concurrency limit (None for no limit).
+        max_per_host: Default concurrency limit for hosts without their own.
+        retry_after: Seconds before a failed host is tried again.
+        client_kwargs: Passed to each host's `ollama.Client` (see
+            `models.backends.client_options`).
+    """
+
+    def __init__(self, hosts, max_per_host=None, retry_after=30, **client_kwargs):
+        self.retry_after = retry_after
+        self._hosts = []
+        for host in hosts:
+            url, limit = host if isinstance(host, tuple) else (host, None)
+            self._hosts.append(_Host(url, limit or max_per_host, client_kwargs))
+        if not self._hosts:
+            raise ValueError("HostPool needs at least one host")
+        self._cond = threading.Condition()
+
+    @property
+    def hosts(self):
+        return [host.url for host in self._hosts]
+
+    def check_health(self):
+        """Probe every host and return a `{url: healthy}` dict."""
+        status = {}
+        for host in self._hosts:
+            try:
+                host.client.list()
+                healthy = True
+            except Exception:
+                healthy = False
+            with self._cond:
+                host.healthy = healthy
+                host.down_until = 0.0 if healthy else time.monotonic() + self.retry_after
+                self._cond.notify_all()
+            status[host.url] = healthy
+        return status
+
+    def _acquire(self, exclude):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                candidates = [
+                    host for host in self._hosts
+                    if host not in exclude and (host.healthy or host.down_until <= now)
+                ]
+                if not candidates:
+                    raise ConnectionError(f"No healthy Ollama host left (tried {', '.join(host.url for host in exclude) or 'none'})")
+                free = [host for host in candidates if host.limit is None or host.outstanding < host.limit]
+                if free:
+                    host = min(free, key=lambda host: host.outstanding)
+                    host.outstanding += 1
+                    return host
+                self._cond.wait(timeout=1.0)
+
+    def _release(self, host, failed):
+        with self._cond:
+            host.outstanding -= 1
+            if failed:
+                host.healthy = False
+                host.down_until = time.monotonic() + self.retry_after
+            else:
+                host.healthy = True
+            self._cond.notify_all()
+
+    def _call(self, method, **kwargs):
+        tried = []
+        while True:
+            host = self._acquire(tried)
+            try:
+                result = getattr(host.client, method)(**kwargs)
+            except Exception as e:
+                failed = is_host_failure(e)
+                self._release(host, failed)
+                if not failed:
+                    raise
+                print(f"Warning: Ollama host {host.url} failed ({e}); retrying on another host")
+                tried.append(host)
+                continue
+            self._release(host, False)
+            return result
+
+    def _stream_chat(self, **kwargs):
+        # Hold the host until the caller finishes or closes the stream
+        tried = []
+        while True:
+            host = self._acquire(tried)
+            started = failed = False
+            stream = host.client.chat(**kwargs)
+            try:
+                for chunk in stream:
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                failed = is_host_failure(e)
+                if started or not failed:
+                    raise
+                print(f"Warning: Ollama host {host.url} failed ({e}); retrying on another host")
+                tried.append(host)
+            finally:
+                stream.close()
+                self._release(host, failed)
+
+    def chat(self, **kwargs):
+        if kwargs.get('stream'):
+            return self._stream_chat(**kwargs)
+        return self._call('chat', **kwargs)
+
+    def list(self):
+        return self._call('list')
+
+    def warm_up(self, model, keep_alive=None):
+        """Load `model` on every healthy host at once; returns the response of the slowest load."""
+        def load(host):
+            try:
+                return host.client.chat(model=model, messages=[], keep_alive=keep_alive)
+            except Exception as e:
+                print(f"Warning: could not load {model} on {host.url} ({e})")
+                return {}
+
+        now = time.monotonic()
+        hosts = [host for host in self._hosts if host.healthy or host.down_until <= now]
+        with ThreadPoolExecutor(max_workers=max(1, len(hosts))) as executor:
+            responses = list(executor.map(load, hosts))
+        return max(responses, key=lambda response: response.get('load_duration') or 0, default={})
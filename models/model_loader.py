@@ -1,30 +1,357 @@
 # models/model_loader.py
 
-import ollama
+import copy
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from models.backends import OllamaBackend, client_options, is_transient
+from models.host_pool import HostPool
+from models.scheduler import RequestScheduler
+
+# Timing and token counters reported by Ollama for every chat request
+STAT_FIELDS = ['total_duration', 'load_duration', 'prompt_eval_count', 'prompt_eval_duration', 'eval_count', 'eval_duration']
+
+# Longest wait between retries of a failed request, in seconds
+MAX_RETRY_DELAY = 30.0
+
+# Generated tokens allowed when a choice is asked again as a JSON string
+CHOICE_RETRY_TOKENS = 8
 
 class ModelWrapper:
-    def __init__(self, model_name, custom_client_host=None):
+    def __init__(self, model_name, custom_client_host=None, concurrency=1, cache=None, keep_alive=None,
+                 hosts=None, max_per_host=None, backend=None, timeout=None, connect_timeout=10.0, retries=3, retry_backoff=1.0,
+                 deduplicate=False):
         self.model_name = model_name
-        if custom_client_host:
-            # Use custom client
-            self.client = ollama.Client(host=custom_client_host)
-            self.use_custom_client = True
+        # Maximum number of requests in flight at once (1 = sequential)
+        self.concurrency = max(1, int(concurrency))
+        # Optional ResponseCache consulted before every request
+        self.cache = cache
+        # How long the server keeps the model (and its prompt cache) loaded, e.g. '30m'
+        self.keep_alive = keep_alive
+        # Transient failures are retried after a jittered, exponentially growing delay
+        self.retries = max(0, int(retries))
+        self.retry_backoff = retry_backoff
+        self._model_digest = None
+        # Shared by every lane (see `lane`); created here rather than on first
+        # use, so lanes opened at once by concurrent jobs share one set of slots
+        self._scheduler = RequestScheduler(self.concurrency)
+        # Set on the copies returned by `lane`
+        self._lane = None
+        # With `deduplicate`, identical requests in flight at once (e.g. from
+        # two jobs of the evaluation service) are sent once and share the reply
+        self._in_flight = {} if deduplicate else None
+        self._in_flight_lock = threading.Lock()
+        # Keep-alive connections, one per request in flight, reused across requests
+        transport = client_options(timeout=timeout, connect_timeout=connect_timeout, max_connections=self.concurrency)
+        if backend is not None:
+            # Use a pluggable backend (see models.backends)
+            self.client = backend
+        elif hosts:
+            # Spread requests over a pool of servers
+            self.client = HostPool(hosts, max_per_host=max_per_host, **transport)
         else:
-            # Use standard module
-            self.client = None  # Will use the standard module
-            self.use_custom_client = False
+            # A single server: custom_client_host, or OLLAMA_HOST / localhost
+            self.client = OllamaBackend(custom_client_host, **transport)
+
+    def _served_model(self):
+        # The server's entry for this model, or None; a bare name means its ':latest' tag
+        models = self.client.list()['models']
+        wanted = self.model_name if ':' in self.model_name else f"{self.model_name}:latest"
+        return next((m for m in models if m.get('name') in (self.model_name, wanted)), None)
+
+    @property
+    def model_digest(self):
+        """Digest of the served model weights, so cached answers expire when the model is re-pulled."""
+        if self._model_digest is None:
+            try:
+                served = self._served_model()
+            except Exception:
+                served = None
+            self._model_digest = (served or {}).get('digest', '')
+        return self._model_digest
+
+    def check_model(self):
+        """
+        Preflight: raise ValueError if the server is unreachable or does not
+        have the model pulled, before any evaluation work starts.
+        """
+        try:
+            served = self._served_model()
+        except Exception as e:
+            raise ValueError(f"Cannot reach the model server to look up {self.model_name}: {e}") from None
+        if served is None:
+            raise ValueError(f"Model {self.model_name} is not available on the server; pull it first with `ollama pull {self.model_name}`")
+        self._model_digest = served.get('digest', '')
+
+    def warm_up(self, keep_alive=None):
+        """
+        Load the model into memory without generating anything, so the first
+        evaluation request does not pay for a cold load.
+
+        Returns `(seconds, load_seconds)`: the wall time of the warm-up and the
+        part the server reports as loading the model (0 if it was loaded).
+        """
+        client = self.client
+        keep_alive = keep_alive if keep_alive is not None else self.keep_alive
+        start = time.perf_counter()
+        if hasattr(client, 'warm_up'):
+            response = client.warm_up(self.model_name, keep_alive=keep_alive)
+        else:
+            response = client.chat(model=self.model_name, messages=[], keep_alive=keep_alive)
+        return time.perf_counter() - start, (response.get('load_duration') or 0) / 1e9
+
+    def chat(self, prompt, options=None, format=None):
+        """
+        Send `prompt` and return the reply text.
 
-    def chat(self, prompt):
+        With `format`, a JSON schema (or 'json'), the server constrains the
+        reply to a JSON value matching it, e.g. `{"answer": "B"}`.
+        """
+        return self.chat_with_stats(prompt, options=options, format=format)[0]
+
+    def chat_with_stats(self, prompt, options=None, stop_when=None, format=None):
+        """
+        Like `chat`, but also return the request's Ollama counters.
+
+        Returns `(content, stats)`, where `stats` maps the names in STAT_FIELDS
+        to their values (durations in nanoseconds). Cache hits return
+        `{'cached': True}` since no server time was spent.
+
+        With `stop_when`, a function of the text received so far, the reply is
+        streamed and the request is cancelled as soon as it returns True, so no
+        tokens are generated after the answer. The server sends no counters for
+        a cancelled request; its stats hold `{'chunks': <chunks received>,
+        'stopped_early': True}`.
+
+        Transient failures (connection resets, timeouts, 429/5xx) are retried
+        up to `retries` times; stats then include the number of `retries`.
+        A request answered by an identical one already in flight (see
+        `deduplicate`) returns `{'deduplicated': True}`.
+        """
+        key = None
+        if self.cache is not None:
+            # A stopped stream returns less text than a full reply, so keep them apart
+            key_options = options if stop_when is None else dict(options or {}, stream_stop=True)
+            if format:
+                key_options = dict(key_options or {}, format=format)
+            key = self.cache.key(self.model_name, self.model_digest, prompt, key_options)
+            content = self.cache.get(key)
+            if content is not None:
+                return content, {'cached': True}
+
+        send = self._send if self._in_flight is None else self._send_shared
+        content, stats = send(prompt, options, stop_when, format)
+
+        # A deduplicated reply was already stored by the request that was sent
+        if self.cache is not None and not stats.get('deduplicated'):
+            self.cache.put(key, content)
+        return content, stats
+
+    def _send_shared(self, prompt, options, stop_when, format):
+        # Only the first of several identical requests in flight goes to the
+        # server; the others wait for its reply (or error)
+        flight_key = (prompt, json.dumps(options, sort_keys=True), stop_when, json.dumps(format, sort_keys=True))
+        with self._in_flight_lock:
+            shared = self._in_flight.get(flight_key)
+            if shared is None:
+                future = self._in_flight[flight_key] = Future()
+        if shared is not None:
+            content, _ = shared.result()
+            # The server counters belong to the request that was sent
+            return content, {'deduplicated': True}
+        try:
+            result = self._send(prompt, options, stop_when, format)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[flight_key]
+
+    def _send(self, prompt, options, stop_when, format):
         messages = [
             {
                 'role': 'user',
                 'content': prompt,
             },
         ]
-        if self.use_custom_client:
-            response = self.client.chat(model=self.model_name, messages=messages)
-            content = response['message']['content']
-        else:
-            response = ollama.chat(model=self.model_name, messages=messages)
-            content = response['message']['content']
-        return content
+        client = self.client
+        for attempt in range(self.retries + 1):
+            try:
+                if stop_when is None:
+                    response = client.chat(model=self.model_name, messages=messages, options=options, keep_alive=self.keep_alive, format=format or '')
+                    content = response['message']['content']
+                    stats = {field: response[field] for field in STAT_FIELDS if response.get(field) is not None}
+                else:
+                    content, stats = self._stream_until(client, messages, options, stop_when)
+                break
+            except Exception as e:
+                if attempt == self.retries or not is_transient(e):
+                    raise
+                # Full jitter keeps retries from many workers from arriving in lockstep
+                time.sleep(random.uniform(0, min(MAX_RETRY_DELAY, self.retry_backoff * 2 ** attempt)))
+        if attempt:
+            stats['retries'] = attempt
+        return content, stats
+
+    def _stream_until(self, client, messages, options, stop_when):
+        stream = client.chat(model=self.model_name, messages=messages, options=options, keep_alive=self.keep_alive, stream=True)
+        parts = []
+        stats = {}
+        try:
+            for chunk in stream:
+                parts.append(chunk['message']['content'])
+                if chunk.get('done'):
+                    stats = {field: chunk[field] for field in STAT_FIELDS if chunk.get(field) is not None}
+                    break
+                if stop_when(''.join(parts)):
+                    # Cancelled before the server sent its counters
+                    stats = {'chunks': len(parts), 'stopped_early': True}
+                    break
+        finally:
+            # Closing the stream drops the connection, which cancels generation on the server
+            stream.close()
+        return ''.join(parts), stats
+
+    def choose(self, prompt, choices):
+        """
+        Pick one of `choices` (short answer strings such as 'A'..'D') for `prompt`.
+
+        Instead of generating a free-text answer and parsing it, this greedily
+        decodes a single token and matches it against the choices, so each
+        example costs one output token and cannot produce unparseable text.
+
+        A token that matches no choice (e.g. 'The') is asked again with the
+        reply constrained to a JSON string among `choices` (Ollama's `format`
+        option); the stats of such requests hold `'unmatched': True` and the
+        counters of both requests.
+
+        Returns the matching choice, or the stripped reply if it matches none.
+        """
+        return self._choose_with_stats(prompt, choices)[0]
+
+    @staticmethod
+    def _match_choice(reply, choices):
+        token = reply.strip().strip('.:)("\'*').upper()
+        return next((choice for choice in choices if token == choice.upper()), None)
+
+    def _choose_with_stats(self, prompt, choices):
+        reply, stats = self.chat_with_stats(prompt, options={'num_predict': 1, 'temperature': 0})
+        choice = self._match_choice(reply, choices)
+        if choice is not None:
+            return choice, stats
+
+        stats = dict(stats, unmatched=True)
+        try:
+            retry, retry_stats = self.chat_with_stats(prompt, options={'num_predict': CHOICE_RETRY_TOKENS, 'temperature': 0},
+                                                      format={'type': 'string', 'enum': list(choices)})
+        except Exception:
+            # E.g. a backend without constrained replies; keep the first reply
+            return reply.strip(), stats
+        for field in STAT_FIELDS:
+            if retry_stats.get(field) is not None:
+                stats[field] = stats.get(field, 0) + retry_stats[field]
+        try:
+            choice = self._match_choice(json.loads(retry), choices)
+        except (ValueError, TypeError, AttributeError):
+            choice = None
+        return (reply.strip() if choice is None else choice), stats
+
+    def chat_many(self, prompts, options=None, stop_when=None):
+        """
+        Send a stream of prompts with at most `concurrency` requests in flight.
+
+        Yields a `(response, error, latency, stats)` tuple per prompt, in the
+        same order as `prompts`, so callers can score results deterministically
+        no matter which request finishes first. Exactly one of `response` and
+        `error` is None; `latency` is the request's wall time in seconds and
+        `stats` holds the server counters described in `chat_with_stats`.
+        """
+        return self._map(lambda prompt: self.chat_with_stats(prompt, options=options, stop_when=stop_when), prompts)
+
+    def chat_groups(self, prompt_groups, options=None, stop_when=None):
+        """
+        Like `chat_many`, for groups of prompts that share a long prefix.
+
+        The prompts of a group are sent back to back from a single worker, so
+        each one lands on a server slot that still holds the group's prefix in
+        its KV cache. Yields one tuple per prompt, flattened in group order.
+        """
+        def chat_group(group):
+            results = [self._timed_call(lambda prompt: self.chat_with_stats(prompt, options=options, stop_when=stop_when), prompt) for prompt in group]
+            return results, {}
+
+        for results, _, _, _ in self._map(chat_group, prompt_groups):
+            yield from results
+
+    def choose_many(self, requests):
+        """Like `chat_many`, for `(prompt, choices)` pairs answered with `choose`."""
+        return self._map(lambda request: self._choose_with_stats(*request), requests)
+
+    def structured_many(self, requests, options=None):
+        """Like `chat_many`, for `(prompt, format)` pairs whose replies are constrained to the JSON schema `format`."""
+        return self._map(lambda request: self.chat_with_stats(request[0], options=options, format=request[1]), requests)
+
+    @contextmanager
+    def lane(self, name, priority=0):
+        """
+        A copy of this wrapper for one of several tasks evaluated at once,
+        used as `with model.lane(name) as lane:`; the lane is closed when the
+        block ends.
+
+        All lanes of a wrapper share its `concurrency` request slots through a
+        RequestScheduler, so running tasks side by side never puts more than
+        `concurrency` requests in flight; free slots go to the highest
+        `priority` first, then to the lane with the fewest requests in flight.
+        """
+        view = copy.copy(self)
+        view._lane = self._scheduler.lane(name, priority)
+        try:
+            yield view
+        finally:
+            view._lane.close()
+
+    def _map(self, fn, items):
+        call = self._timed_call if self._lane is None else self._lane_call
+        if self.concurrency == 1:
+            for item in items:
+                yield call(fn, item)
+            return
+
+        # The pool bounds the number of requests in flight; the window only
+        # buffers finished results behind a slow head-of-line request.
+        window_size = self.concurrency * 4
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            window = deque()
+            for item in items:
+                window.append(executor.submit(call, fn, item))
+                if len(window) >= window_size:
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+        finally:
+            # If the caller stops early, drop queued requests instead of sending them
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _lane_call(self, fn, item):
+        # Wait for a shared slot outside the timed call, so latency excludes queueing
+        with self._lane.slot():
+            return self._timed_call(fn, item)
+
+    @staticmethod
+    def _timed_call(fn, item):
+        # `fn` returns a (value, stats) pair
+        start = time.perf_counter()
+        try:
+            value, stats = fn(item)
+            return value, None, time.perf_counter() - start, stats
+        except Exception as e:
+            return None, e, time.perf_counter() - start, {}
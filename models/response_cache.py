@@ -0,0 +1,101 @@
+# models/response_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_MODES = ['readwrite', 'readonly', 'refresh', 'off']
+
+class ResponseCache:
+    """
+    Persistent, content-addressed store of model responses.
+
+    Entries are keyed by a hash of the model name, model digest, prompt and
+    generation options, and live in a single SQLite file. When the stored
+    responses exceed `max_size_mb`, the least recently used entries are
+    evicted.
+
+    Modes:
+        readwrite: Serve hits from the cache and store new responses.
+        readonly: Serve hits from the cache but never write to it.
+        refresh: Ignore existing entries and overwrite them with new responses.
+    """
+
+    def __init__(self, path, mode='readwrite', max_size_mb=1024):
+        if mode not in CACHE_MODES or mode == 'off':
+            raise ValueError(f"Invalid cache mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Evaluations call into the cache from worker threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(model_name, model_digest, prompt, options=None):
+        payload = json.dumps([model_name, model_digest, prompt, options or {}], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for `key`, or None on a miss."""
+        if self.mode == 'refresh':
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.mode == 'readwrite':
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        if self.mode == 'readonly':
+            return
+        data = json.dumps(response)
+        size = len(data.encode('utf-8'))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, size, time.time()),
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_size:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is back under its cap
+        while self._size > self.max_size:
+            rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT 256").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._size <= self.max_size:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size -= size
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,86 @@
+# models/scheduler.py
+
+import threading
+from contextlib import contextmanager
+
+class _Lane:
+    def __init__(self, scheduler, name, priority):
+        self.scheduler = scheduler
+        self.name = name
+        self.priority = priority
+        self.waiting = 0
+        self.in_flight = 0
+        self.served = 0
+        self.closed = False
+
+    @contextmanager
+    def slot(self):
+        self.scheduler._acquire(self)
+        try:
+            yield
+        finally:
+            self.scheduler._release(self)
+
+    def close(self):
+        """Stop scheduling this lane once its requests are done, so finished tasks do not pile up."""
+        self.scheduler._close(self)
+
+class RequestScheduler:
+    """
+    Shares a fixed number of request slots between several concurrent tasks.
+
+    Each task sends its requests through its own lane (see
+    `ModelWrapper.lane`). When a slot frees up it goes to a waiting lane with
+    the highest priority; among equal priorities, to the lane with the fewest
+    requests in flight (then the fewest served), so every task gets an equal
+    share and small tasks finish early while the server stays busy with the
+    others.
+
+    Args:
+        slots: Requests in flight at once across all lanes.
+    """
+
+    def __init__(self, slots):
+        self.slots = max(1, int(slots))
+        self._free = self.slots
+        self._lanes = []
+        self._cond = threading.Condition()
+
+    def lane(self, name, priority=0):
+        with self._cond:
+            lane = _Lane(self, name, priority)
+            self._lanes.append(lane)
+            return lane
+
+    def _drop(self, lane):
+        if lane.closed and not lane.waiting and not lane.in_flight and lane in self._lanes:
+            self._lanes.remove(lane)
+
+    def _close(self, lane):
+        with self._cond:
+            lane.closed = True
+            self._drop(lane)
+
+    def _next(self):
+        waiting = [lane for lane in self._lanes if lane.waiting]
+        if not waiting:
+            return None
+        return min(waiting, key=lambda lane: (-lane.priority, lane.in_flight, lane.served))
+
+    def _acquire(self, lane):
+        with self._cond:
+            lane.waiting += 1
+            while not (self._free and self._next() is lane):
+                self._cond.wait()
+            lane.waiting -= 1
+            lane.in_flight += 1
+            lane.served += 1
+            self._free -= 1
+            self._cond.notify_all()
+
+    def _release(self, lane):
+        with self._cond:
+            lane.in_flight -= 1
+            self._free += 1
+            self._drop(lane)
+            self._cond.notify_all()
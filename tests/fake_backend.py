@@ -0,0 +1,62 @@
+# tests/fake_backend.py
+
+import re
+import threading
+
+from evaluations.registry import find_task
+from evaluations.runner import TaskData
+from models.backends import Backend
+
+class FakeBackend(Backend):
+    """
+    In-memory stand-in for a model server.
+
+    `reply` maps a prompt to the reply text (default: 'A'). `errors` are
+    raised, one per request, before any reply is given. `gate`, when set, is
+    an Event every request waits on, so tests can hold requests in flight.
+    Every prompt sent is recorded in `prompts`.
+    """
+
+    def __init__(self, reply=None, errors=None, gate=None, warm_up_error=None):
+        self.reply = reply or (lambda prompt: 'A')
+        self.errors = list(errors or [])
+        self.gate = gate
+        self.warm_up_error = warm_up_error
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def chat(self, model, messages, options=None, keep_alive=None, stream=False, format=''):
+        prompt = messages[-1]['content']
+        with self._lock:
+            self.prompts.append(prompt)
+            error = self.errors.pop(0) if self.errors else None
+        if self.gate is not None:
+            self.gate.wait(5)
+        if error is not None:
+            raise error
+        response = {'message': {'role': 'assistant', 'content': self.reply(prompt)}, 'done': True,
+                    'prompt_eval_count': len(prompt.split()), 'eval_count': 1, 'eval_duration': 1000}
+        return self._chunks(response) if stream else response
+
+    @staticmethod
+    def _chunks(response):
+        yield response
+
+    def warm_up(self, model, keep_alive=None):
+        if self.warm_up_error is not None:
+            raise self.warm_up_error
+        return {'load_duration': 0}
+
+    def list(self):
+        return {'models': [{'name': 'fake:latest', 'digest': 'fake'}]}
+
+def boolq_data(count):
+    """BoolQ and TaskData of `count` synthetic examples; the answer to example i is Yes when i is even."""
+    task = find_task('boolq')
+    examples = [{'passage': f"Passage {i}.", 'question': f"is {i} even", 'label': int(i % 2 == 0)} for i in range(count)]
+    return task, TaskData(task, examples=examples)
+
+def answer_boolq(prompt):
+    """The right reply to a prompt of `boolq_data`."""
+    number = int(re.search(r"is (\d+) even", prompt).group(1))
+    return 'Yes' if number % 2 == 0 else 'No'
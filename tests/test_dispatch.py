@@ -0,0 +1,45 @@
+# tests/test_dispatch.py
+
+import hashlib
+
+from evaluations.run_log import RunLog
+from evaluations.runner import _dispatch, dispatch_order, run_task
+from fake_backend import FakeBackend, answer_boolq, boolq_data
+from models.model_loader import ModelWrapper
+
+COSTS = [5, 1, 9, 3, 7, 2]
+
+def test_dispatch_order():
+    assert dispatch_order(COSTS) == [0, 1, 2, 3, 4, 5]
+    assert dispatch_order(COSTS, 'longest-first') == [2, 4, 0, 3, 5, 1]
+    # Bins of two by cost, most expensive bin first, dataset order within a bin
+    assert dispatch_order(COSTS, 'binned', bins=3) == [2, 4, 0, 3, 1, 5]
+
+def test_results_carry_their_original_position():
+    sent = []
+
+    def send(units):
+        for unit in units:
+            sent.append(unit)
+            yield from (f"{unit}:{i}" for i in range(len(unit)))
+
+    # Units of one, two and three examples, starting at positions 0, 1 and 3
+    units = ['a', 'bb', 'ccc']
+    results = list(_dispatch(send, units, [1, 3, 2], sizes=[1, 2, 3], order='longest-first'))
+    assert sent == ['bb', 'ccc', 'a']
+    assert results == [(1, 'bb:0'), (2, 'bb:1'), (3, 'ccc:0'), (4, 'ccc:1'), (5, 'ccc:2'), (0, 'a:0')]
+
+def test_reordered_run_records_each_example_under_its_index(tmp_path):
+    task, data = boolq_data(20)
+    # Longer prompts for higher indices, so longest-first reverses the order
+    for idx in range(len(data)):
+        data.prompts[idx] += ' ' * idx
+    backend = FakeBackend(reply=answer_boolq)
+    run = RunLog('run', runs_dir=str(tmp_path))
+    result = run_task(ModelWrapper('fake', backend=backend, concurrency=3), task, run=run, data=data, order='longest-first',
+                      progress=lambda scored, count: None)
+    assert set(backend.prompts[:3]) == set(data.prompts[17:])
+    assert result['correct'] == result['total'] == 20
+    for idx, record in run.completed(task.name).items():
+        assert record['prompt_hash'] == hashlib.sha256(data.prompts[idx].encode('utf-8')).hexdigest()
+        assert record['label'] == data.labels[idx]
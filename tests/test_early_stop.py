@@ -0,0 +1,43 @@
+# tests/test_early_stop.py
+
+import pytest
+
+from evaluations.metrics import wilson_interval
+from evaluations.runner import MIN_EARLY_STOP_SAMPLES, run_task
+from fake_backend import FakeBackend, answer_boolq, boolq_data
+from models.model_loader import ModelWrapper
+
+def quiet(scored, count):
+    pass
+
+def test_wilson_interval():
+    assert wilson_interval(50, 100) == pytest.approx((40.383, 59.617), abs=1e-3)
+    assert wilson_interval(0, 10) == pytest.approx((0.0, 27.753), abs=1e-3)
+    assert wilson_interval(10, 10)[1] == pytest.approx(100.0)
+    assert wilson_interval(0, 0) == (0.0, 100.0)
+    # A higher confidence widens the interval
+    low, high = wilson_interval(50, 100, confidence=0.99)
+    assert low < 40.383 and high > 59.617
+
+def test_stops_once_interval_is_narrow_enough():
+    task, data = boolq_data(200)
+    backend = FakeBackend(reply=answer_boolq)
+    result = run_task(ModelWrapper('fake', backend=backend), task, data=data, ci_width=12, progress=quiet)
+    # Every answer is right: 30/30 gives an interval 11.4 points wide
+    assert result['stopped_early']
+    assert result['total'] == MIN_EARLY_STOP_SAMPLES
+    assert result['ci_high'] - result['ci_low'] <= 12
+    # Requests still queued were not sent
+    assert len(backend.prompts) == MIN_EARLY_STOP_SAMPLES
+
+def test_no_stop_before_minimum_samples():
+    task, data = boolq_data(20)
+    result = run_task(ModelWrapper('fake', backend=FakeBackend(reply=answer_boolq)), task, data=data, ci_width=50, progress=quiet)
+    assert not result['stopped_early']
+    assert result['total'] == 20
+
+def test_time_budget():
+    task, data = boolq_data(50)
+    result = run_task(ModelWrapper('fake', backend=FakeBackend(reply=answer_boolq)), task, data=data, time_budget=0, progress=quiet)
+    assert result['stopped_early']
+    assert result['total'] == 1
@@ -0,0 +1,29 @@
+# tests/test_extractors.py
+
+from evaluations.boolq_eval import EXTRACTOR as BOOLQ
+from evaluations.extractors import KeywordExtractor
+from evaluations.rte_eval import EXTRACTOR as RTE
+
+def test_no_does_not_match_inside_not():
+    assert BOOLQ('not') is None
+    assert RTE('I do not know') is None
+
+def test_earlier_group_wins():
+    # Groups are checked in order, so 'correct' (True) outranks 'No' (False)
+    assert BOOLQ('No, this is not correct') is True
+    assert RTE('No, this is not correct') is False
+
+def test_plain_answers():
+    assert BOOLQ('Yes.') is True
+    assert BOOLQ('No.') is False
+    assert RTE('Yes.') is True
+
+def test_case_is_ignored():
+    assert BOOLQ('YES') is True
+    assert BOOLQ('nO, it is FaLsE') is False
+    assert RTE('Answer: yEs') is True
+
+def test_extract_many_matches_single_calls():
+    extractor = KeywordExtractor([('a', ['alpha']), ('b', ['beta', 'be'])])
+    responses = ['Beta', 'alpha or beta', 'alphabet', '', 'to BE']
+    assert extractor.extract_many(responses) == [extractor(response) for response in responses] == ['b', 'a', None, None, 'b']
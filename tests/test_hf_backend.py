@@ -0,0 +1,101 @@
+# tests/test_hf_backend.py
+
+import threading
+
+import pytest
+
+from models.hf_backend import split_duration
+
+MODEL = 'sshleifer/tiny-gpt2'
+
+# Greedy decoding, so the same prompt always gives the same reply
+GREEDY = {'temperature': 0, 'num_predict': 8}
+
+def test_split_duration_adds_up():
+    assert split_duration(1000, [1, 3]) == [250, 750]
+    assert sum(split_duration(1001, [1, 1, 1])) == 1001
+    assert split_duration(10, [0, 0]) == [5, 5]
+    assert split_duration(10, []) == []
+
+@pytest.fixture(scope='module')
+def backend():
+    pytest.importorskip('torch')
+    pytest.importorskip('transformers')
+    from models.hf_backend import HFBackend
+
+    try:
+        return HFBackend(MODEL, batch_size=4, batch_wait=0.5)
+    except OSError as e:
+        pytest.skip(f"{MODEL} is not available: {e}")
+
+def ask(backend, prompt, **options):
+    return backend.chat(MODEL, [{'role': 'user', 'content': prompt}], options={**GREEDY, **options})
+
+def test_requests_share_a_batch(backend, monkeypatch):
+    sizes = []
+    generate = backend._generate
+
+    def recording(batch, load_ns):
+        sizes.append(len(batch))
+        return generate(batch, load_ns)
+
+    monkeypatch.setattr(backend, '_generate', recording)
+    prompts = ['The cat sat on the', 'Once upon a time', 'The capital of France is', 'One two three four']
+    replies = [None] * len(prompts)
+
+    def send(i):
+        replies[i] = ask(backend, prompts[i])
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(len(prompts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sizes == [4]
+    assert all(reply['done'] for reply in replies)
+    # The batch's generation time is shared out by generated tokens
+    for reply in replies:
+        assert reply['eval_duration'] >= 0
+    longest = max(replies, key=lambda reply: reply['eval_count'])
+    shortest = min(replies, key=lambda reply: reply['eval_count'])
+    assert longest['eval_duration'] >= shortest['eval_duration']
+
+def test_reply_is_cut_at_stop_string(backend):
+    content = ask(backend, 'The cat sat on the')['message']['content']
+    if len(content) < 2:
+        pytest.skip("the model's reply is too short to cut")
+    stop = content[len(content) // 2:]
+    assert ask(backend, 'The cat sat on the', stop=[stop])['message']['content'] == content[:content.index(stop)]
+
+def test_reply_is_trimmed_at_eos(backend, monkeypatch):
+    generate = backend.model.generate
+
+    def early_eos(**kwargs):
+        # End the reply after two generated tokens
+        output = generate(**kwargs)
+        output[:, kwargs['input_ids'].shape[1] + 2] = backend.tokenizer.eos_token_id
+        return output
+
+    monkeypatch.setattr(backend.model, 'generate', early_eos)
+    reply = ask(backend, 'The cat sat on the')
+    assert reply['eval_count'] == 2
+
+def test_stats(backend):
+    # Charge the model load to the warm-up, not to this request
+    backend.warm_up(MODEL)
+    prompt = 'The capital of France is'
+    reply = ask(backend, prompt)
+    assert set(reply) == {'model', 'message', 'done', 'total_duration', 'load_duration', 'prompt_eval_count', 'eval_count', 'eval_duration'}
+    assert reply['model'] == MODEL
+    assert reply['message']['role'] == 'assistant'
+    assert reply['prompt_eval_count'] == len(backend.tokenizer(prompt)['input_ids'])
+    assert 0 < reply['eval_count'] <= GREEDY['num_predict']
+    assert 0 < reply['eval_duration'] <= reply['total_duration']
+    assert reply['load_duration'] == 0
+
+def test_chat_template_adds_no_second_bos(backend, monkeypatch):
+    monkeypatch.setattr(backend.tokenizer, 'chat_template', "{{ bos_token }}{% for m in messages %}{{ m['content'] }}{% endfor %}", raising=False)
+    prompt = 'The capital of France is'
+    reply = ask(backend, prompt)
+    assert reply['prompt_eval_count'] == len(backend.tokenizer(backend.tokenizer.bos_token + prompt, add_special_tokens=False)['input_ids'])
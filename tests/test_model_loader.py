@@ -0,0 +1,102 @@
+# tests/test_model_loader.py
+
+import threading
+import time
+
+import httpx
+import ollama
+import pytest
+
+from fake_backend import FakeBackend
+from models.model_loader import ModelWrapper
+
+def model_with(errors, retries=3):
+    backend = FakeBackend(errors=errors)
+    # No backoff, so retries do not sleep
+    return ModelWrapper('fake', backend=backend, retries=retries, retry_backoff=0), backend
+
+@pytest.mark.parametrize('error', [httpx.ConnectError('refused'), httpx.ReadTimeout('slow'), ollama.ResponseError('busy', 503)])
+def test_transient_errors_are_retried(error):
+    model, backend = model_with([error, error])
+    assert model.chat_with_stats('prompt') == ('A', {'eval_count': 1, 'eval_duration': 1000, 'prompt_eval_count': 1, 'retries': 2})
+    assert len(backend.prompts) == 3
+
+def test_fatal_error_is_not_retried():
+    model, backend = model_with([ollama.ResponseError('bad request', 400)])
+    with pytest.raises(ollama.ResponseError):
+        model.chat_with_stats('prompt')
+    assert len(backend.prompts) == 1
+
+def test_retries_run_out():
+    model, backend = model_with([httpx.ConnectError('refused')] * 3, retries=2)
+    with pytest.raises(httpx.ConnectError):
+        model.chat_with_stats('prompt')
+    assert len(backend.prompts) == 3
+
+def test_failed_request_is_reported_per_prompt():
+    model, _ = model_with([ollama.ResponseError('bad request', 400)])
+    results = list(model.chat_many(['first', 'second']))
+    assert isinstance(results[0][1], ollama.ResponseError)
+    assert results[1][0] == 'A' and results[1][1] is None
+
+def send_twice(model, backend, gate):
+    # The first request is held at the server until the second has joined it
+    results = [None, None]
+
+    def send(i):
+        try:
+            results[i] = model.chat_with_stats('prompt')
+        except Exception as e:
+            results[i] = e
+
+    first = threading.Thread(target=send, args=(0,))
+    first.start()
+    while not backend.prompts:
+        time.sleep(0.001)
+    second = threading.Thread(target=send, args=(1,))
+    second.start()
+    time.sleep(0.05)
+    gate.set()
+    first.join()
+    second.join()
+    return results
+
+def test_identical_requests_in_flight_are_sent_once():
+    gate = threading.Event()
+    backend = FakeBackend(gate=gate)
+    model = ModelWrapper('fake', backend=backend, concurrency=2, deduplicate=True)
+    sent, shared = send_twice(model, backend, gate)
+    assert backend.prompts == ['prompt']
+    assert sent[0] == shared[0] == 'A'
+    assert shared[1] == {'deduplicated': True}
+    assert 'eval_count' in sent[1]
+    # Once answered, the same prompt goes to the server again
+    model.chat_with_stats('prompt')
+    assert backend.prompts == ['prompt', 'prompt']
+
+def test_shared_request_error_reaches_every_caller():
+    gate = threading.Event()
+    backend = FakeBackend(gate=gate, errors=[ollama.ResponseError('bad request', 400)])
+    model = ModelWrapper('fake', backend=backend, concurrency=2, deduplicate=True)
+    results = send_twice(model, backend, gate)
+    assert backend.prompts == ['prompt']
+    assert all(isinstance(result, ollama.ResponseError) for result in results)
+    assert model._in_flight == {}
+
+def test_choice_token_is_matched():
+    model = ModelWrapper('fake', backend=FakeBackend(reply=lambda prompt: ' b.'))
+    assert model._choose_with_stats('prompt', ['A', 'B'])[0] == 'B'
+
+def test_unmatched_choice_is_asked_again_constrained():
+    replies = iter(['The', '"B"'])
+    backend = FakeBackend(reply=lambda prompt: next(replies))
+    choice, stats = ModelWrapper('fake', backend=backend)._choose_with_stats('prompt', ['A', 'B'])
+    assert choice == 'B'
+    assert stats['unmatched'] and stats['eval_count'] == 2
+    assert len(backend.prompts) == 2
+
+def test_unmatched_choice_without_constrained_replies():
+    backend = FakeBackend(reply=lambda prompt: 'The', errors=[None, ValueError('format is not supported')])
+    choice, stats = ModelWrapper('fake', backend=backend)._choose_with_stats('prompt', ['A', 'B'])
+    assert choice == 'The'
+    assert stats['unmatched']
@@ -0,0 +1,50 @@
+# tests/test_response_cache.py
+
+import time
+
+from fake_backend import FakeBackend
+from models.model_loader import ModelWrapper
+from models.response_cache import ResponseCache
+
+def test_key_covers_model_digest_prompt_and_options():
+    key = ResponseCache.key('llama', 'abc', 'prompt', {'temperature': 0, 'num_predict': 1})
+    assert key == ResponseCache.key('llama', 'abc', 'prompt', {'num_predict': 1, 'temperature': 0})
+    assert ResponseCache.key('llama', 'abc', 'prompt', None) == ResponseCache.key('llama', 'abc', 'prompt', {})
+    others = [
+        ResponseCache.key('mistral', 'abc', 'prompt', {'temperature': 0, 'num_predict': 1}),
+        ResponseCache.key('llama', 'def', 'prompt', {'temperature': 0, 'num_predict': 1}),
+        ResponseCache.key('llama', 'abc', 'prompt 2', {'temperature': 0, 'num_predict': 1}),
+        ResponseCache.key('llama', 'abc', 'prompt', {'temperature': 0, 'num_predict': 2}),
+    ]
+    assert key not in others and len(set(others)) == len(others)
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    # Room for about three 100-character replies
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), max_size_mb=350 / (1024 * 1024))
+    for key in 'abc':
+        cache.put(key, key * 100)
+        time.sleep(0.01)
+    assert cache.get('a') == 'a' * 100
+    time.sleep(0.01)
+    cache.put('d', 'd' * 100)
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == ['a' * 100, 'c' * 100, 'd' * 100]
+
+def test_modes(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    ResponseCache(path).put('k', 'stored')
+    readonly = ResponseCache(path, mode='readonly')
+    readonly.put('other', 'ignored')
+    assert (readonly.get('k'), readonly.get('other')) == ('stored', None)
+    refresh = ResponseCache(path, mode='refresh')
+    assert refresh.get('k') is None
+    refresh.put('k', 'new')
+    assert ResponseCache(path).get('k') == 'new'
+
+def test_wrapper_serves_repeated_prompts_from_cache(tmp_path):
+    backend = FakeBackend()
+    model = ModelWrapper('fake', backend=backend, cache=ResponseCache(str(tmp_path / 'cache.sqlite')))
+    assert model.chat_with_stats('prompt')[1].get('cached') is None
+    assert model.chat_with_stats('prompt') == ('A', {'cached': True})
+    model.chat_with_stats('prompt', options={'temperature': 0})
+    assert backend.prompts == ['prompt', 'prompt']
@@ -0,0 +1,41 @@
+# tests/test_run_log.py
+
+from evaluations.run_log import RunLog
+from evaluations.runner import run_task
+from fake_backend import FakeBackend, answer_boolq, boolq_data
+from models.model_loader import ModelWrapper
+
+def test_records_survive_reopening(tmp_path):
+    run = RunLog('run', runs_dir=str(tmp_path), metadata={'model': 'fake'})
+    run.record('boolq', 3, 'prompt', 'Yes', True, True, 0.1, label=True)
+    run.close()
+    reopened = RunLog('run', runs_dir=str(tmp_path), metadata={'model': 'other'})
+    assert reopened.metadata['model'] == 'fake'
+    assert list(reopened.completed('boolq')) == [3]
+    assert reopened.completed('boolq')[3]['response'] == 'Yes'
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    run = RunLog('run', runs_dir=str(tmp_path))
+    run.record('boolq', 0, 'prompt', 'Yes', True, True, 0.1)
+    run.close()
+    with open(run.path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "example", "task": "boolq", "ind')
+    assert list(RunLog('run', runs_dir=str(tmp_path)).completed('boolq')) == [0]
+
+def test_resume_retries_only_failed_examples(tmp_path):
+    task, data = boolq_data(6)
+    quiet = lambda scored, count: None
+    # The first two requests fail; the others are answered and recorded
+    backend = FakeBackend(reply=answer_boolq, errors=[ConnectionResetError('reset')] * 2)
+    model = ModelWrapper('fake', backend=backend, retries=0)
+    first = run_task(model, task, run=RunLog('run', runs_dir=str(tmp_path)), data=data, progress=quiet)
+    assert (first['correct'], first['total'], first['errors']) == (4, 6, 2)
+
+    backend.prompts = []
+    resumed = run_task(model, task, run=RunLog('run', runs_dir=str(tmp_path)), data=data, progress=quiet)
+    assert backend.prompts == data.prompts[:2]
+    assert (resumed['correct'], resumed['total'], resumed['errors']) == (6, 6, 0)
+
+    backend.prompts = []
+    run_task(model, task, run=RunLog('run', runs_dir=str(tmp_path)), data=data, progress=quiet)
+    assert backend.prompts == []
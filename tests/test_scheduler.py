@@ -0,0 +1,29 @@
+# tests/test_scheduler.py
+
+import threading
+import time
+
+from fake_backend import FakeBackend
+from models.model_loader import ModelWrapper
+
+def test_lane_is_dropped_when_closed():
+    model = ModelWrapper('fake', concurrency=2, backend=FakeBackend())
+    with model.lane('boolq') as lane:
+        assert len(model._scheduler._lanes) == 1
+        assert [content for content, _, _, _ in lane.chat_many(['a', 'b', 'c'])] == ['A', 'A', 'A']
+    assert model._scheduler._lanes == []
+
+def test_closed_lane_stays_until_its_requests_finish():
+    gate = threading.Event()
+    model = ModelWrapper('fake', concurrency=1, backend=FakeBackend(gate=gate))
+    with model.lane('boolq') as lane:
+        lane_state = lane._lane
+        request = threading.Thread(target=lambda: list(lane.chat_many(['a'])))
+        request.start()
+        while not lane_state.in_flight:
+            time.sleep(0.001)
+    # Closed with a request in flight: still scheduled until it is released
+    assert model._scheduler._lanes == [lane_state]
+    gate.set()
+    request.join()
+    assert model._scheduler._lanes == []
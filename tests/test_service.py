@@ -0,0 +1,38 @@
+# tests/test_service.py
+
+import time
+
+from evaluations.service import EvaluationService
+from fake_backend import FakeBackend
+from models.model_loader import ModelWrapper
+
+def run_job(service, **fields):
+    job = service.submit(dict({'models': ['fake'], 'evaluations': []}, **fields))
+    return job, list(job.follow())
+
+def test_failed_warm_up_is_a_warning(tmp_path):
+    backend = FakeBackend(warm_up_error=ConnectionError('refused'))
+    service = EvaluationService(lambda name: ModelWrapper(name, backend=backend), runs_dir=str(tmp_path))
+    job, events = run_job(service)
+    assert job.status == 'done'
+    warnings = [event for event in events if event['event'] == 'warning']
+    assert len(warnings) == 1 and 'refused' in warnings[0]['message']
+
+def test_summary_results_are_a_copy(tmp_path):
+    service = EvaluationService(lambda name: ModelWrapper(name, backend=FakeBackend()), runs_dir=str(tmp_path))
+    job, _ = run_job(service)
+    job.record('fake', 'boolq', {'accuracy': 50.0})
+    summary = job.summary()
+    job.record('fake', 'arc', {'accuracy': 25.0})
+    assert list(summary['results']['fake']) == ['boolq']
+
+def test_old_finished_jobs_are_forgotten(tmp_path):
+    service = EvaluationService(lambda name: ModelWrapper(name, backend=FakeBackend()), runs_dir=str(tmp_path), max_jobs=1, keep_finished=2)
+    jobs = [run_job(service)[0] for _ in range(3)]
+    # The last job is forgotten only after its thread finishes, just after its final event
+    for _ in range(100):
+        if len(service.job_list()) == 2:
+            break
+        time.sleep(0.01)
+    assert [job.id for job in service.job_list()] == [job.id for job in jobs[1:]]
+    assert service.job(jobs[0].id) is None
@@ -0,0 +1,33 @@
+# tests/test_startup.py
+
+import subprocess
+import sys
+import time
+
+import pytest
+
+from benchmarks.run_benchmarks import HEAVY_MODULES, ROOT, STARTUP_BUDGET, STARTUP_COMMANDS
+
+# Runs each main.py entry point in-process, then lists the HEAVY_MODULES it imported
+PROBE = """
+import sys
+import main
+try:
+    main.main({argv!r})
+except SystemExit:
+    pass
+print(' '.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+@pytest.mark.parametrize('name', list(STARTUP_COMMANDS))
+def test_startup_within_budget(name):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + STARTUP_COMMANDS[name], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    elapsed = time.perf_counter() - start
+    assert elapsed <= STARTUP_BUDGET, f"{name} took {elapsed:.3f}s (budget {STARTUP_BUDGET}s)"
+
+@pytest.mark.parametrize('argv', [['--help'], ['--list-tasks']])
+def test_startup_skips_heavy_modules(argv):
+    probe = PROBE.format(argv=argv, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', probe], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    assert output.splitlines()[-1].split() == []
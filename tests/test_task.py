@@ -0,0 +1,17 @@
+# tests/test_task.py
+
+from evaluations.registry import find_task
+
+def test_stream_options_leave_stop_to_the_client():
+    assert find_task('boolq').stream_options() == {'num_predict': 8}
+
+def test_leading_newline_does_not_end_the_reply():
+    task = find_task('piqa')
+    assert not task.reply_complete('\n')
+    assert not task.reply_complete('\n\nThe better')
+    assert task.reply_complete('\n\nThe better one\n')
+
+def test_answer_ends_the_reply():
+    task = find_task('boolq')
+    assert not task.reply_complete('Ye')
+    assert task.reply_complete('\nYes,')
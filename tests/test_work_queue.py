@@ -0,0 +1,36 @@
+# tests/test_work_queue.py
+
+import time
+
+from evaluations.work_queue import WorkQueue
+
+def expire(queue, item_id):
+    # Backdate the claim past the lease, as if its worker died
+    queue._conn.execute("UPDATE items SET claimed_at = ? WHERE id = ?", (time.time() - queue.lease - 1, item_id))
+
+def test_claim_takes_back_expired_lease(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'))
+    queue.add('run', 'shard 0/1', ['--shard', '0/1'])
+    item_id, argv = queue.claim('run')
+    assert argv == ['--shard', '0/1']
+    assert queue.claim('run') is None
+    expire(queue, item_id)
+    assert queue.claim('run') == (item_id, argv)
+
+def test_add_leaves_running_items_alone(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'))
+    queue.add('run', 'shard 0/1', [])
+    queue.claim('run')
+    queue.add('run', 'shard 0/1', [])
+    assert queue.counts('run') == {'running': 1}
+
+def test_requeue_expired(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'))
+    queue.add('run', 'shard 0/2', [])
+    queue.add('run', 'shard 1/2', [])
+    stale, _ = queue.claim('run')
+    queue.claim('run')
+    expire(queue, stale)
+    assert queue.requeue_expired('run') == 1
+    assert queue.names('run', 'pending') == ['shard 0/2']
+    assert queue.names('run', 'running') == ['shard 1/2']